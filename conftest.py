@@ -0,0 +1,46 @@
+"""
+Shared pytest fixtures for the MusicTool tests.
+"""
+
+from xml.sax.saxutils import quoteattr
+
+import pytest
+
+
+@pytest.fixture
+def write_nml(tmp_path, monkeypatch):
+    """
+    Factory writing a minimal Traktor NML collection into tmp_path.
+    
+    Also switches the working directory to tmp_path, so parse caches and the
+    default database paths stay out of the repository.
+    
+    Each track is a dict with 'artist' and 'title', and optionally 'album',
+    'file' (file name under /music/) and 'playtime' (seconds).
+    """
+    monkeypatch.chdir(tmp_path)
+    
+    def write(tracks, name="collection.nml"):
+        entries = []
+        for track in tracks:
+            location = ''
+            if track.get('file'):
+                location = f'<LOCATION DIR="/:music/:" FILE={quoteattr(track["file"])}/>'
+            entries.append(
+                f'<ENTRY ARTIST={quoteattr(track["artist"])} TITLE={quoteattr(track["title"])}>'
+                f'{location}<ALBUM TITLE={quoteattr(track.get("album", ""))}/>'
+                f'<INFO GENRE="House" PLAYTIME="{track.get("playtime", 0)}"/>'
+                f'<TEMPO BPM="120"/></ENTRY>'
+            )
+        
+        nml_file = tmp_path / name
+        nml_file.write_text(
+            '<?xml version="1.0" encoding="UTF-8" standalone="no" ?>\n'
+            f'<NML VERSION="19"><COLLECTION ENTRIES="{len(entries)}">\n'
+            + '\n'.join(entries)
+            + '\n</COLLECTION></NML>\n',
+            encoding='utf-8'
+        )
+        return str(nml_file)
+    
+    return write
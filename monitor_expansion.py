@@ -12,7 +12,6 @@ Author: MusicTool MVP
 Created: June 12, 2025
 """
 
-import sqlite3
 import pandas as pd
 import time
 import sys
@@ -23,30 +22,32 @@ from datetime import datetime
 sys.path.insert(0, str(Path(__file__).parent / "src" / "python"))
 
 from core.discogs_parser import DiscogsCSVParser
+from core.collection_expander import connect_database, read_sql_frame
 
 
-def get_current_progress():
+DB_PATH = './data/musictool.db'
+
+
+def get_current_progress(conn, db_path=DB_PATH):
     """Get current expansion progress from database."""
     try:
-        # Connect to database
-        conn = sqlite3.connect('./data/musictool.db')
-        
-        # Get expanded tracks
-        tracks_df = pd.read_sql('SELECT * FROM expanded_tracks', conn)
-        conn.close()
+        # Let SQLite aggregate rather than loading the whole table
+        total_tracks, unique_releases = conn.execute(
+            'SELECT COUNT(*), COUNT(DISTINCT discogs_release_id) FROM expanded_tracks'
+        ).fetchone()
         
-        if len(tracks_df) == 0:
+        if total_tracks == 0:
             return 0, 0, []
         
-        unique_releases = tracks_df['discogs_release_id'].nunique()
-        total_tracks = len(tracks_df)
-        
-        # Get recent releases (last 5)
-        recent_releases = tracks_df.groupby('discogs_release_id').agg({
-            'artist': 'first',
-            'album': 'first', 
-            'created_at': 'first'
-        }).sort_values('created_at', ascending=False).head(5)
+        # Get recent releases (last 5); with MIN() SQLite takes artist/album from
+        # the release's earliest row
+        recent_releases = read_sql_frame('''
+            SELECT discogs_release_id, artist, album, MIN(created_at) AS created_at
+            FROM expanded_tracks
+            GROUP BY discogs_release_id
+            ORDER BY created_at DESC
+            LIMIT 5
+        ''', conn, db_path, index_col='discogs_release_id')
         
         return unique_releases, total_tracks, recent_releases
         
@@ -70,7 +71,11 @@ def main():
     """Monitor expansion progress."""
     total_releases = get_total_releases()
     start_time = datetime.now()
-    last_count = 0
+    
+    # One connection for the whole session; PRAGMA data_version changes only when
+    # another connection (the expander) commits, so unchanged ticks skip the queries
+    conn = connect_database(DB_PATH, read_only=True)
+    last_data_version = None
     
     print("🎵 MusicTool Collection Expansion Monitor")
     print("=" * 50)
@@ -80,7 +85,10 @@ def main():
     
     try:
         while True:
-            current_releases, current_tracks, recent = get_current_progress()
+            data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+            if data_version != last_data_version:
+                current_releases, current_tracks, recent = get_current_progress(conn)
+                last_data_version = data_version
             
             # Calculate progress
             progress_pct = (current_releases / total_releases) * 100
@@ -89,7 +97,6 @@ def main():
             # Calculate rate
             now = datetime.now()
             elapsed = (now - start_time).total_seconds()
-            releases_added = current_releases - last_count if last_count > 0 else 0
             
             if elapsed > 0:
                 rate = current_releases / elapsed * 60  # releases per minute
@@ -116,13 +123,14 @@ def main():
                     print(f"   → {release_id}: {row['artist']} - {row['album']}")
                 print()
             
-            last_count = current_releases
             time.sleep(5)  # Update every 5 seconds
             
     except KeyboardInterrupt:
         print(f"\n\n⏹️ Monitoring stopped")
         print(f"📊 Final stats: {current_releases}/{total_releases} releases ({progress_pct:.1f}%)")
         print(f"🎵 Total tracks: {current_tracks}")
+    finally:
+        conn.close()
 
 
 if __name__ == "__main__":
@@ -34,14 +34,17 @@ def setup_logging():
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     log_file = log_dir / f"expansion_{timestamp}.log"
     
-    # Configure logging
+    # Configure logging: full per-release detail goes to the file, the console
+    # only gets INFO summaries
+    file_handler = logging.FileHandler(log_file)
+    file_handler.setLevel(logging.DEBUG)
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setLevel(logging.INFO)
+    
     logging.basicConfig(
-        level=logging.INFO,
+        level=logging.DEBUG,
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_file),
-            logging.StreamHandler(sys.stdout)
-        ]
+        handlers=[file_handler, stream_handler]
     )
     
     logger = logging.getLogger(__name__)
@@ -77,7 +80,7 @@ def get_current_status(expander):
     
     try:
         # Check existing database
-        existing_tracks = expander.load_physical_collection()
+        existing_tracks = expander.load_physical_collection(columns=['discogs_release_id'])
         if len(existing_tracks) > 0:
             unique_releases = existing_tracks['discogs_release_id'].nunique()
             total_tracks = len(existing_tracks)
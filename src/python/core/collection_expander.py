@@ -9,22 +9,123 @@ Created: June 12, 2025
 """
 
 import pandas as pd
+import numpy as np
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import sqlite3
+import queue
+import weakref
 import json
 from pathlib import Path
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Set, Optional, Any, Iterator
+from contextlib import contextmanager
 import logging
 from datetime import datetime
 
-from .discogs_client import DiscogsAPIClient, load_api_key_from_env
+from .discogs_client import DiscogsAPIClient, ASYNC_AVAILABLE, load_api_key_from_env
 from .discogs_parser import DiscogsCSVParser
 
+try:
+    import connectorx as cx
+except ImportError:  # Optional: faster Arrow-backed reads, falls back to pandas
+    cx = None
+
 logger = logging.getLogger(__name__)
 
+# Applied to every connection: WAL lets the monitor read while the expander writes,
+# and synchronous=NORMAL is safe under WAL while skipping an fsync per commit
+_CONNECTION_PRAGMAS = """
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA mmap_size=268435456;
+    PRAGMA cache_size=-65536;
+"""
+
+
+def connect_database(db_path: str, read_only: bool = False, check_same_thread: bool = True) -> sqlite3.Connection:
+    """
+    Open a connection to the collection database with performance PRAGMAs applied.
+    
+    Args:
+        db_path: Path to SQLite database
+        read_only: Reject writes on this connection (PRAGMA query_only)
+        check_same_thread: Restrict the connection to the creating thread
+        
+    Returns:
+        Open sqlite3 connection
+    """
+    conn = sqlite3.connect(db_path, check_same_thread=check_same_thread)
+    conn.executescript(_CONNECTION_PRAGMAS)
+    if read_only:
+        conn.execute('PRAGMA query_only=true')
+    return conn
+
+
+def read_sql_frame(query: str, conn: sqlite3.Connection, db_path: Optional[str] = None,
+                   index_col: Optional[str] = None) -> pd.DataFrame:
+    """
+    Run a SELECT into a DataFrame, via connectorx when it is installed.
+    
+    connectorx reads straight into Arrow instead of building Python objects row by
+    row, but it opens the database by path; without a path (or without connectorx)
+    the query runs through pd.read_sql_query on conn.
+    
+    Args:
+        query: SQL query to run
+        conn: Open connection used for the pandas fallback
+        db_path: Path to the SQLite database, enabling the connectorx path
+        index_col: Column to use as the DataFrame index
+        
+    Returns:
+        DataFrame with the query results
+    """
+    if cx is not None and db_path is not None:
+        try:
+            df = cx.read_sql(f"sqlite://{Path(db_path).resolve()}", query)
+            return df.set_index(index_col) if index_col else df
+        except Exception as e:
+            logger.debug("connectorx read failed, falling back to pandas: %s", e)
+    
+    return pd.read_sql_query(query, conn, index_col=index_col)
+
+
+def _close_connections(connections: List[sqlite3.Connection]):
+    """Close every pooled connection; registered as a finalizer per expander."""
+    while connections:
+        connections.pop().close()
+
+
+# Insert order for expanded_tracks rows (id and created_at are filled in by SQLite)
+_TRACK_COLUMNS = (
+    'artist', 'title', 'position', 'duration',
+    'album', 'album_artist', 'label', 'catalog_number', 'release_year', 'format_type', 'format_description',
+    'collection_folder', 'date_added', 'media_condition', 'sleeve_condition', 'notes',
+    'discogs_release_id', 'source', 'expanded_date',
+)
+
+# Built once so the writer connection's statement cache reuses the prepared statement.
+# Rows already present (same release, position and title) are left untouched.
+_INSERT_TRACK_SQL = (f"INSERT OR IGNORE INTO expanded_tracks ({', '.join(_TRACK_COLUMNS)}) "
+                     f"VALUES ({', '.join('?' for _ in _TRACK_COLUMNS)})")
+
+
+def _sql_value(value: Any) -> Any:
+    """Convert pandas/numpy scalars into values sqlite3 can bind."""
+    if pd.isna(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return str(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
 
 class CollectionExpander:
     """Expands Discogs releases into individual tracks and manages the physical collection database."""
     
+    READER_POOL_SIZE = 4
+    
     def __init__(self, api_key: str, db_path: str = "./data/musictool.db"):
         """
         Initialize the Collection Expander.
@@ -37,19 +138,35 @@ class CollectionExpander:
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
         
+        # Connection pool: one lazily opened writer plus up to READER_POOL_SIZE idle readers.
+        # Connections may be used from executor threads, but never concurrently.
+        self._write_conn = None
+        self._reader_pool = queue.Queue(maxsize=self.READER_POOL_SIZE)
+        self._connections = []
+        self._finalizer = weakref.finalize(self, _close_connections, self._connections)
+        
+        # Release IDs present in the database; loaded on first use, then kept in sync by saves
+        self._expanded_ids = None
+        
         # Initialize database
         self._init_database()
         
         logger.info(f"Collection Expander initialized with database: {db_path}")
     
-    def expand_collection(self, discogs_csv_path: str, max_releases: int = None, skip_existing: bool = True) -> pd.DataFrame:
+    def expand_collection(self, discogs_csv_path: str, max_releases: int = None, skip_existing: bool = True,
+                          max_concurrency: int = 8, batch_size: int = 25) -> pd.DataFrame:
         """
         Expand a Discogs collection CSV into individual tracks.
         
         Args:
             discogs_csv_path: Path to Discogs CSV export
             max_releases: Maximum number of releases to process (None for all)
-            skip_existing: Skip releases already in database
+            skip_existing: Skip releases already in database. Releases that are
+                re-expanded come from the API client's disk cache when available,
+                and only tracks not yet stored are added.
+            max_concurrency: Maximum number of in-flight API requests (async tasks, or
+                worker threads when aiohttp is not installed)
+            batch_size: Number of releases to buffer per database write
             
         Returns:
             DataFrame with expanded track collection
@@ -78,67 +195,147 @@ class CollectionExpander:
         release_ids = releases_to_process['release_id'].tolist()
         logger.info(f"Processing {len(release_ids)} releases")
         
+        # Index release info by ID once (first row wins, as with duplicate copies in the CSV)
+        releases_by_id = releases_df.drop_duplicates('release_id').set_index('release_id', drop=False)
+        
         # Track progress
-        expanded_tracks = []
-        processed = 0
-        errors = 0
+        progress = {'processed': 0, 'errors': 0}
         
-        for i, release_id in enumerate(release_ids):
-            try:
-                logger.info(f"Processing release {i+1}/{len(release_ids)}: {release_id}")
-                
-                # Get release info from CSV
-                release_info = releases_df[releases_df['release_id'] == release_id].iloc[0]
-                logger.info(f"  → {release_info['artist_clean']} - {release_info['title']}")
-                
-                # Get tracklist from API
-                tracklist = self.api_client.get_release_tracklist(release_id)
-                
-                if tracklist:
-                    track_count = len([t for t in tracklist if t['type_'] == 'track'])
-                    
-                    if track_count > 0:
-                        # Convert tracks to expanded format
-                        release_tracks = []
-                        for track in tracklist:
-                            if track['type_'] == 'track':  # Skip headings, etc.
-                                expanded_track = self._create_expanded_track(track, release_info)
-                                release_tracks.append(expanded_track)
-                        
-                        # Save this release immediately (for crash recovery)
-                        release_df = pd.DataFrame(release_tracks)
-                        self._save_expanded_collection(release_df)
-                        
-                        expanded_tracks.extend(release_tracks)
-                        processed += 1
-                        logger.info(f"  ✅ {track_count} tracks added and saved to database")
-                    else:
-                        logger.warning(f"  ⚠️ No actual tracks found (only headings/metadata)")
-                        processed += 1
-                else:
-                    logger.warning(f"  ❌ No tracklist found for release {release_id}")
-                    errors += 1
-                    
-                # Progress update every 10 releases
-                if (i + 1) % 10 == 0:
-                    logger.info(f"📊 Progress: {i+1}/{len(release_ids)} releases processed ({processed} successful, {errors} errors)")
-                    
-            except KeyboardInterrupt:
-                logger.info("⏹️ Interrupted by user")
-                break
-            except Exception as e:
-                logger.error(f"  ❌ Error processing release {release_id}: {e}")
-                errors += 1
-                continue
+        try:
+            if ASYNC_AVAILABLE:
+                asyncio.run(self._expand_releases(release_ids, releases_by_id, max_concurrency, batch_size, progress))
+            else:
+                self._expand_releases_threaded(release_ids, releases_by_id, max_concurrency, batch_size, progress)
+        except KeyboardInterrupt:
+            logger.info("⏹️ Interrupted by user")
+        finally:
+            self.api_client.save_rate_limit_state()
         
         # Final summary
         logger.info(f"🎉 Expansion complete!")
-        logger.info(f"📊 Final stats: {processed} successful, {errors} errors out of {len(release_ids)} total")
+        logger.info(f"📊 Final stats: {progress['processed']} successful, {progress['errors']} errors out of {len(release_ids)} total")
         
         # Return full collection
         return self.load_physical_collection()
     
-    def _create_expanded_track(self, track: Dict[str, Any], release_info: pd.Series) -> Dict[str, Any]:
+    async def _expand_releases(self, release_ids: List[int], releases_by_id: pd.DataFrame,
+                               max_concurrency: int, batch_size: int, progress: Dict[str, int]):
+        """Fetch tracklists concurrently, saving releases in batches as responses arrive."""
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        # Rows waiting to be written; flushed every batch_size releases (for crash recovery)
+        buffer = []
+        buffered_ids = []
+        pending_flush = None
+        
+        async with self.api_client.create_async_session() as session:
+            
+            async def fetch(release_id):
+                async with semaphore:
+                    return release_id, await self.api_client.get_release_tracklist_async(session, release_id)
+            
+            tasks = [asyncio.create_task(fetch(release_id)) for release_id in release_ids]
+            
+            try:
+                for i, next_result in enumerate(asyncio.as_completed(tasks)):
+                    release_id, tracklist = await next_result
+                    rows = self._process_release(i, len(release_ids), release_id, tracklist, releases_by_id, progress)
+                    if rows:
+                        buffer.extend(rows)
+                        buffered_ids.append(_sql_value(release_id))
+                    
+                    # Flush a full batch off the event loop
+                    if len(buffered_ids) >= batch_size:
+                        rows, release_ids_batch = buffer, buffered_ids
+                        buffer, buffered_ids = [], []
+                        # Shielded: cancelling this task must not abandon the batch mid-write
+                        pending_flush = loop.run_in_executor(None, self._save_expanded_batch, rows, release_ids_batch)
+                        await asyncio.shield(pending_flush)
+            finally:
+                for task in tasks:
+                    task.cancel()
+                
+                # An interrupted wait leaves the flush running on its executor thread;
+                # let it finish before the final save uses the same writer connection
+                if pending_flush is not None:
+                    await asyncio.wait([pending_flush])
+                
+                # Persist whatever is buffered, including on interrupt
+                self._save_expanded_batch(buffer, buffered_ids)
+    
+    def _expand_releases_threaded(self, release_ids: List[int], releases_by_id: pd.DataFrame,
+                                  max_concurrency: int, batch_size: int, progress: Dict[str, int]):
+        """Thread-pool fallback for _expand_releases when aiohttp is not installed."""
+        buffer = []
+        buffered_ids = []
+        
+        with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+            futures = {pool.submit(self.api_client.get_release_tracklist, release_id): release_id
+                       for release_id in release_ids}
+            
+            try:
+                for i, future in enumerate(as_completed(futures)):
+                    release_id = futures[future]
+                    rows = self._process_release(i, len(release_ids), release_id, future.result(), releases_by_id, progress)
+                    if rows:
+                        buffer.extend(rows)
+                        buffered_ids.append(_sql_value(release_id))
+                    
+                    # Writes stay on this thread; workers only fetch
+                    if len(buffered_ids) >= batch_size:
+                        self._save_expanded_batch(buffer, buffered_ids)
+                        buffer, buffered_ids = [], []
+            finally:
+                for future in futures:
+                    future.cancel()
+                
+                # Persist whatever is buffered, including on interrupt
+                self._save_expanded_batch(buffer, buffered_ids)
+    
+    def _process_release(self, i: int, total: int, release_id: int, tracklist: List[Dict[str, Any]],
+                         releases_by_id: pd.DataFrame, progress: Dict[str, int]) -> List[tuple]:
+        """Turn one fetched tracklist into insert-ready rows, updating the progress counters."""
+        try:
+            logger.debug("Processing release %d/%d: %s", i + 1, total, release_id)
+            
+            # Get release info from CSV
+            # Plain dict: the per-track builder does many lookups per release
+            release_info = releases_by_id.loc[release_id].to_dict()
+            logger.debug("  → %s - %s", release_info['artist_clean'], release_info['title'])
+            
+            rows = []
+            if tracklist:
+                track_count = len([t for t in tracklist if t['type_'] == 'track'])
+                
+                if track_count > 0:
+                    # Convert tracks straight to insert-ready rows
+                    for track in tracklist:
+                        if track['type_'] == 'track':  # Skip headings, etc.
+                            expanded_track = self._create_expanded_track(track, release_info)
+                            rows.append(tuple(_sql_value(expanded_track[c]) for c in _TRACK_COLUMNS))
+                    
+                    progress['processed'] += 1
+                    logger.debug("  ✅ %d tracks added", track_count)
+                else:
+                    logger.warning("  ⚠️ No actual tracks found for release %s (only headings/metadata)", release_id)
+                    progress['processed'] += 1
+            else:
+                logger.warning("  ❌ No tracklist found for release %s", release_id)
+                progress['errors'] += 1
+            
+            # Progress update every 10 releases
+            if (i + 1) % 10 == 0:
+                logger.info(f"📊 Progress: {i+1}/{total} releases processed ({progress['processed']} successful, {progress['errors']} errors)")
+            
+            return rows
+            
+        except Exception as e:
+            logger.error(f"  ❌ Error processing release {release_id}: {e}")
+            progress['errors'] += 1
+            return []
+    
+    def _create_expanded_track(self, track: Dict[str, Any], release_info: Dict[str, Any]) -> Dict[str, Any]:
         """Create an expanded track record combining track and release info."""
         
         # Extract artist - prefer track artists, fallback to release artist
@@ -149,7 +346,7 @@ class CollectionExpander:
             artist = release_info['artist_clean']
         
         # Create unified track record
-        expanded_track = {
+        return {
             # Core track info
             'artist': artist,
             'title': track['title'],
@@ -177,12 +374,52 @@ class CollectionExpander:
             'source': 'discogs_physical',
             'expanded_date': datetime.now().isoformat()
         }
+    
+    def _connect(self, read_only: bool = False) -> sqlite3.Connection:
+        """Open a pooled connection to this expander's database."""
+        conn = connect_database(self.db_path, read_only=read_only, check_same_thread=False)
+        self._connections.append(conn)
+        return conn
+    
+    def _writer(self) -> sqlite3.Connection:
+        """Return the long-lived writer connection, opening it on first use."""
+        if self._write_conn is None:
+            self._write_conn = self._connect()
+        return self._write_conn
+    
+    @contextmanager
+    def _reader(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a read-only connection from the pool."""
+        try:
+            conn = self._reader_pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect(read_only=True)
         
-        return expanded_track
+        try:
+            yield conn
+        finally:
+            try:
+                self._reader_pool.put_nowait(conn)
+            except queue.Full:
+                self._connections.remove(conn)
+                conn.close()
+    
+    def close(self):
+        """Close all pooled database connections and the API client."""
+        self._finalizer()
+        self.api_client.close()
     
     def _init_database(self):
-        """Initialize SQLite database for storing expanded collection."""
-        with sqlite3.connect(self.db_path) as conn:
+        """
+        Initialize SQLite database for storing expanded collection.
+        
+        Tracks are unique on (discogs_release_id, position, title). The title is part
+        of the key because Discogs tracklists can leave positions empty, and keying on
+        (release, position) alone would drop every unnumbered track after the first.
+        Databases created before this key existed are de-duplicated once, keeping the
+        earliest row per key, before the unique index is built.
+        """
+        with self._writer() as conn:
             cursor = conn.cursor()
             
             # Create expanded tracks table
@@ -218,54 +455,92 @@ class CollectionExpander:
                 ON expanded_tracks(artist, title)
             ''')
             
+            # Covers release-id lookups as well as per-release first-seen times (monitor);
+            # it supersedes the older single-column idx_release_id
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_release_created 
+                ON expanded_tracks(discogs_release_id, created_at)
+            ''')
+            cursor.execute('DROP INDEX IF EXISTS idx_release_id')
+            
             cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_release_id 
-                ON expanded_tracks(discogs_release_id)
+                CREATE INDEX IF NOT EXISTS idx_created_at 
+                ON expanded_tracks(created_at)
             ''')
             
+            # Unique track key makes re-inserting a release idempotent. Databases created
+            # before this index may hold duplicate rows, which must go before it can be built.
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_release_track'")
+            if cursor.fetchone() is None:
+                cursor.execute('''
+                    DELETE FROM expanded_tracks WHERE id NOT IN (
+                        SELECT MIN(id) FROM expanded_tracks
+                        GROUP BY discogs_release_id, position, title
+                    )
+                ''')
+                if cursor.rowcount > 0:
+                    logger.warning(f"Removed {cursor.rowcount} duplicate track rows before adding the unique track index")
+                cursor.execute('''
+                    CREATE UNIQUE INDEX idx_release_track 
+                    ON expanded_tracks(discogs_release_id, position, title)
+                ''')
+            
             conn.commit()
             logger.info("Database initialized successfully")
     
-    def _get_expanded_release_ids(self) -> List[int]:
-        """Get list of release IDs that have already been expanded."""
+    def _get_expanded_release_ids(self) -> Set[int]:
+        """Get the set of release IDs that have already been expanded."""
+        if self._expanded_ids is None:
+            self._expanded_ids = self._load_expanded_release_ids()
+        return self._expanded_ids
+    
+    def _load_expanded_release_ids(self) -> Set[int]:
+        """Query the database for release IDs that have already been expanded."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._reader() as conn:
                 cursor = conn.cursor()
                 cursor.execute('SELECT DISTINCT discogs_release_id FROM expanded_tracks')
-                release_ids = [row[0] for row in cursor.fetchall()]
+                release_ids = {row[0] for row in cursor.fetchall()}
                 logger.info(f"Found {len(release_ids)} already expanded releases")
                 return release_ids
         except Exception as e:
             logger.warning(f"Error getting expanded release IDs: {e}")
-            return []
+            return set()
     
-    def _save_expanded_collection(self, df: pd.DataFrame):
-        """Save expanded collection to SQLite database."""
-        if df.empty:
-            logger.warning("No tracks to save")
+    def _save_expanded_batch(self, rows: List[tuple], release_ids: List[int]):
+        """
+        Save a batch of expanded tracks to SQLite in a single transaction.
+        
+        Args:
+            rows: Track rows with values ordered as _TRACK_COLUMNS
+            release_ids: Releases the rows belong to
+        """
+        if not rows:
             return
         
-        with sqlite3.connect(self.db_path) as conn:
-            # Clear existing data for these releases
-            release_ids = df['discogs_release_id'].unique().tolist()
-            placeholders = ','.join(['?' for _ in release_ids])
-            
-            cursor = conn.cursor()
-            cursor.execute(f'''
-                DELETE FROM expanded_tracks 
-                WHERE discogs_release_id IN ({placeholders})
-            ''', release_ids)
-            
-            # Insert new data
-            df.to_sql('expanded_tracks', conn, if_exists='append', index=False)
-            
-            logger.info(f"Saved {len(df)} tracks to database")
+        with self._writer() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(_INSERT_TRACK_SQL, rows)
+        
+        if self._expanded_ids is not None:
+            self._expanded_ids.update(release_ids)
+        
+        logger.info(f"Saved {len(rows)} tracks from {len(release_ids)} releases to database")
     
-    def load_physical_collection(self) -> pd.DataFrame:
-        """Load the expanded physical collection from database."""
+    def load_physical_collection(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Load the expanded physical collection from database.
+        
+        Args:
+            columns: Columns to load (None for all)
+            
+        Returns:
+            DataFrame with one row per expanded track
+        """
+        column_sql = ', '.join(columns) if columns else '*'
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                df = pd.read_sql_query('SELECT * FROM expanded_tracks', conn)
+            with self._reader() as conn:
+                df = read_sql_frame(f'SELECT {column_sql} FROM expanded_tracks', conn, self.db_path)
                 logger.info(f"Loaded {len(df)} tracks from physical collection database")
                 return df
         except Exception as e:
@@ -274,7 +549,9 @@ class CollectionExpander:
     
     def get_expansion_stats(self) -> Dict[str, Any]:
         """Get statistics about the expanded collection."""
-        df = self.load_physical_collection()
+        df = self.load_physical_collection(columns=[
+            'discogs_release_id', 'artist', 'album', 'format_type', 'collection_folder', 'label', 'release_year'
+        ])
         
         if df.empty:
             return {'total_tracks': 0, 'total_releases': 0}
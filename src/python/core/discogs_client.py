@@ -8,54 +8,126 @@ Author: MusicTool MVP
 Created: June 12, 2025
 """
 
+import pandas as pd
 import requests
+import asyncio
+import threading
 import time
 import json
 import os
+import re
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Optional, Any
 import logging
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+try:
+    import aiohttp
+except ImportError:  # Optional: without it, callers fall back to threaded fetching
+    aiohttp = None
+
+try:
+    import orjson
+except ImportError:  # Optional: faster cache (de)serialization, falls back to json
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+_CACHE_FILE_RE = re.compile(r'release_(\d+)\.json$')
+
+# Fields of each track returned by get_release_tracklist
+_TRACK_FIELDS = ('position', 'title', 'duration', 'type_', 'artists', 'release_id')
+
+# Whether the *_async methods can be used
+ASYNC_AVAILABLE = aiohttp is not None
+
 
 class DiscogsAPIClient:
     """Client for the Discogs API with rate limiting and caching."""
     
-    def __init__(self, api_key: str, cache_dir: str = "./data/cache"):
+    # Releases kept in memory in front of the on-disk JSON cache
+    MEMORY_CACHE_SIZE = 512
+    
+    # Retries after a 429 response, and the back-off used when Retry-After is absent
+    RATE_LIMIT_RETRIES = 3
+    DEFAULT_RETRY_AFTER = 60.0
+    
+    # Minimum seconds between saves of the rate-limit bucket during a run; it is
+    # also saved after batches, on 429 back-offs and on close()
+    BUCKET_SAVE_INTERVAL = 10.0
+    
+    # Threads used to read cache files for a batch
+    CACHE_READ_WORKERS = 8
+    
+    # Seconds to establish a connection / wait between bytes, so a hung socket fails fast
+    CONNECT_TIMEOUT = 3.05
+    READ_TIMEOUT = 10
+    
+    def __init__(self, api_key: str, cache_dir: str = "./data/cache",
+                 cache_ttl_seconds: Optional[float] = 30 * 86400):
         """
         Initialize the Discogs API client.
         
         Args:
             api_key: Discogs API key
             cache_dir: Directory for caching API responses
+            cache_ttl_seconds: Age after which cached releases are refreshed (None to keep forever)
         """
         self.api_key = api_key
         self.base_url = "https://api.discogs.com"
         self.cache_dir = Path(cache_dir)
+        self.cache_ttl_seconds = cache_ttl_seconds
         self.cache_dir.mkdir(parents=True, exist_ok=True)
         
-        # Rate limiting: Discogs allows 60 requests per minute
+        # Bounded LRU of parsed releases; entries are shared, so callers must not mutate them
+        self._memory_cache: OrderedDict = OrderedDict()
+        self._memory_lock = threading.Lock()
+        
+        # IDs with a cache file, scanned once so misses don't each cost a stat()
+        with os.scandir(self.cache_dir) as entries:
+            self._cached_ids = {int(m.group(1)) for entry in entries
+                                if (m := _CACHE_FILE_RE.match(entry.name))}
+        
+        # Rate limiting: Discogs allows 60 requests per minute. A token bucket lets a
+        # burst of up to a minute's budget through, then refills at 1 request/second.
         self.requests_per_minute = 60
-        self.min_delay = 60 / self.requests_per_minute  # 1 second between requests
-        self.last_request_time = 0
+        self.min_delay = 60 / self.requests_per_minute  # Steady-state gap between requests
+        self._bucket_capacity = float(self.requests_per_minute)
+        self._refill_rate = self.requests_per_minute / 60  # Tokens per second
+        self._bucket_tokens = self._bucket_capacity
+        self._bucket_last = time.monotonic()
+        self._rate_lock = threading.Lock()  # Shared by worker threads and the event loop
+        
+        # Bucket state is saved between runs, so back-to-back scripts share one budget
+        self._bucket_file = self.cache_dir / '_bucket.json'
+        self._bucket_saved_at = time.monotonic()
+        self._load_bucket_state()
         
-        # Setup session with retries
+        # Setup session with retries for transient server errors. 429 is deliberately
+        # left out: get_release handles it through the token bucket, and retrying it
+        # here as well would multiply the attempts and sleep outside the bucket.
         self.session = requests.Session()
         retry_strategy = Retry(
             total=3,
             backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504],
+            status_forcelist=[500, 502, 503, 504],
+            allowed_methods=['GET'],
+            raise_on_status=False,  # Hand the final 5xx back to get_release
         )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
+        # One host, many workers: the pool must hold a connection per concurrent
+        # fetch so keep-alive sockets are reused instead of re-handshaking
+        adapter = HTTPAdapter(max_retries=retry_strategy, pool_connections=4,
+                              pool_maxsize=32, pool_block=False)
         self.session.mount("http://", adapter)
         self.session.mount("https://", adapter)
         
         # Default headers
         self.session.headers.update({
             'User-Agent': 'MusicTool/1.0',
+            'Connection': 'keep-alive',
             'Authorization': f'Discogs token={api_key}'
         })
         
@@ -72,57 +144,230 @@ class DiscogsAPIClient:
         Returns:
             Dictionary with release details or None if error
         """
-        cache_file = self.cache_dir / f"release_{release_id}.json"
-        
         # Check cache first
-        if use_cache and cache_file.exists():
-            try:
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    logger.debug(f"Using cached data for release {release_id}")
-                    return json.load(f)
-            except Exception as e:
-                logger.warning(f"Error reading cache for release {release_id}: {e}")
+        if use_cache:
+            cached = self._read_cache(release_id, self.cache_ttl_seconds)
+            if cached is not None:
+                return cached
         
         # Make API request
         try:
             url = f"{self.base_url}/releases/{release_id}"
             
-            # Rate limiting
-            self._wait_for_rate_limit()
-            
-            logger.info(f"Fetching release {release_id} from Discogs API")
-            response = self.session.get(url)
-            
-            if response.status_code == 200:
-                release_data = response.json()
+            for _ in range(self.RATE_LIMIT_RETRIES + 1):
+                # Rate limiting
+                self._wait_for_rate_limit()
                 
-                # Cache the response
-                try:
-                    with open(cache_file, 'w', encoding='utf-8') as f:
-                        json.dump(release_data, f, indent=2, ensure_ascii=False)
-                    logger.debug(f"Cached release {release_id} data")
-                except Exception as e:
-                    logger.warning(f"Error caching release {release_id}: {e}")
+                logger.debug("Fetching release %s from Discogs API", release_id)
+                response = self.session.get(url, headers=self._conditional_headers(release_id),
+                                            timeout=(self.CONNECT_TIMEOUT, self.READ_TIMEOUT))
                 
-                return release_data
+                if response.status_code == 200:
+                    release_data = _loads(response.content)
+                    self._write_cache(release_id, release_data, response.headers.get('ETag'))
+                    return release_data
+                    
+                elif response.status_code == 304:
+                    return self._read_unchanged(release_id)
+                    
+                elif response.status_code == 404:
+                    logger.warning(f"Release {release_id} not found")
+                    return None
+                    
+                elif response.status_code == 429:
+                    self._handle_rate_limited(release_id, response.headers)
+                    
+                else:
+                    logger.error(f"API error for release {release_id}: {response.status_code}")
+                    return None
+            
+            logger.error(f"Giving up on release {release_id}: still rate limited")
+            return None
                 
-            elif response.status_code == 404:
-                logger.warning(f"Release {release_id} not found")
-                return None
+        except Exception as e:
+            logger.error(f"Error fetching release {release_id}: {e}")
+            return None
+    
+    def create_async_session(self) -> 'aiohttp.ClientSession':
+        """Create an aiohttp session carrying the same headers as the sync session."""
+        timeout = aiohttp.ClientTimeout(sock_connect=self.CONNECT_TIMEOUT, sock_read=self.READ_TIMEOUT)
+        return aiohttp.ClientSession(headers=dict(self.session.headers), timeout=timeout)
+    
+    async def get_release_async(self, session: 'aiohttp.ClientSession', release_id: int,
+                                use_cache: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Async counterpart of get_release, sharing its cache and rate limit.
+        
+        Args:
+            session: Session from create_async_session()
+            release_id: Discogs release ID
+            use_cache: Whether to use cached response if available
+            
+        Returns:
+            Dictionary with release details or None if error
+        """
+        if use_cache:
+            cached = self._read_cache(release_id, self.cache_ttl_seconds)
+            if cached is not None:
+                return cached
+        
+        try:
+            url = f"{self.base_url}/releases/{release_id}"
+            
+            for _ in range(self.RATE_LIMIT_RETRIES + 1):
+                await self._wait_for_rate_limit_async()
                 
-            elif response.status_code == 429:
-                logger.warning(f"Rate limit hit for release {release_id}")
-                time.sleep(60)  # Wait a minute and try again
-                return self.get_release(release_id, use_cache=False)
+                logger.debug("Fetching release %s from Discogs API", release_id)
+                async with session.get(url, headers=self._conditional_headers(release_id)) as response:
+                    status = response.status
+                    headers = response.headers
+                    release_data = _loads(await response.read()) if status == 200 else None
                 
-            else:
-                logger.error(f"API error for release {release_id}: {response.status_code}")
-                return None
+                if status == 200:
+                    self._write_cache(release_id, release_data, headers.get('ETag'))
+                    return release_data
+                    
+                elif status == 304:
+                    return self._read_unchanged(release_id)
+                    
+                elif status == 404:
+                    logger.warning(f"Release {release_id} not found")
+                    return None
+                    
+                elif status == 429:
+                    self._handle_rate_limited(release_id, headers)
+                    
+                else:
+                    logger.error(f"API error for release {release_id}: {status}")
+                    return None
+            
+            logger.error(f"Giving up on release {release_id}: still rate limited")
+            return None
                 
         except Exception as e:
             logger.error(f"Error fetching release {release_id}: {e}")
             return None
     
+    def _read_cache(self, release_id: int, max_age: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Read a cached release, returning None on a miss or unreadable file.
+        
+        Files older than max_age seconds count as misses. Releases already held in
+        memory are returned regardless, as they were fresh when this process loaded them.
+        """
+        with self._memory_lock:
+            if release_id in self._memory_cache:
+                self._memory_cache.move_to_end(release_id)
+                return self._memory_cache[release_id]
+        
+        if release_id not in self._cached_ids:
+            return None
+        
+        cache_file = self.cache_dir / f"release_{release_id}.json"
+        try:
+            if max_age is not None and time.time() - cache_file.stat().st_mtime > max_age:
+                logger.debug("Cached release %s is stale", release_id)
+                return None
+            
+            release_data = _loads(cache_file.read_bytes())
+            logger.debug("Using cached data for release %s", release_id)
+        except FileNotFoundError:
+            # Removed since the directory was scanned
+            self._cached_ids.discard(release_id)
+            return None
+        except Exception as e:
+            logger.warning(f"Error reading cache for release {release_id}: {e}")
+            return None
+        
+        self._remember(release_id, release_data)
+        return release_data
+    
+    def _write_cache(self, release_id: int, release_data: Dict[str, Any], etag: Optional[str] = None):
+        """Write a release response (and its ETag, for conditional refreshes) to the cache."""
+        self._remember(release_id, release_data)
+        
+        cache_file = self.cache_dir / f"release_{release_id}.json"
+        etag_file = cache_file.with_suffix('.etag')
+        try:
+            if orjson:
+                payload = orjson.dumps(release_data)
+            else:
+                # Machine-read only, so compact separators and no indentation
+                payload = json.dumps(release_data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            
+            # Write-then-rename, so an interrupted run never leaves a truncated cache file
+            tmp_file = cache_file.with_suffix('.json.tmp')
+            tmp_file.write_bytes(payload)
+            os.replace(tmp_file, cache_file)
+            self._cached_ids.add(release_id)
+            
+            if etag:
+                etag_file.write_text(etag, encoding='utf-8')
+            elif etag_file.exists():
+                etag_file.unlink()  # Would no longer match the cached body
+            logger.debug("Cached release %s data", release_id)
+        except Exception as e:
+            logger.warning(f"Error caching release {release_id}: {e}")
+    
+    def _conditional_headers(self, release_id: int) -> Dict[str, str]:
+        """If-None-Match header for a cached release, so an unchanged refresh returns 304."""
+        etag_file = self.cache_dir / f"release_{release_id}.etag"
+        try:
+            etag = etag_file.read_text(encoding='utf-8')
+        except OSError:
+            return {}
+        
+        # A 304 is only useful with a cached body to serve; without one, drop the
+        # stale ETag so this and later requests fetch the release in full
+        if not self._has_cached_body(release_id):
+            self._discard_etag(release_id)
+            return {}
+        
+        return {'If-None-Match': etag}
+    
+    def _has_cached_body(self, release_id: int) -> bool:
+        """
+        Whether a release's cached response loads (regardless of its age).
+        
+        Loading puts the body in the in-memory cache, so serving a 304 afterwards
+        does not read the file again.
+        """
+        return self._read_cache(release_id) is not None
+    
+    def _discard_etag(self, release_id: int):
+        """Remove a release's saved ETag."""
+        try:
+            (self.cache_dir / f"release_{release_id}.etag").unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Error removing ETag for release {release_id}: {e}")
+    
+    def _read_unchanged(self, release_id: int) -> Optional[Dict[str, Any]]:
+        """Serve a release from cache after the API answered 304 Not Modified."""
+        logger.debug("Release %s not modified, using cached data", release_id)
+        cached = self._read_cache(release_id)
+        if cached is None:
+            # Lost since the request was sent; without its ETag the next attempt is a full GET
+            logger.warning(f"Release {release_id} not modified but cache is unreadable")
+            self._discard_etag(release_id)
+            return None
+        
+        # Confirmed current, so restart its TTL
+        try:
+            os.utime(self.cache_dir / f"release_{release_id}.json")
+        except OSError:
+            pass
+        return cached
+    
+    def _remember(self, release_id: int, release_data: Dict[str, Any]):
+        """Add a release to the in-memory LRU, evicting the least recently used."""
+        with self._memory_lock:
+            self._memory_cache[release_id] = release_data
+            self._memory_cache.move_to_end(release_id)
+            if len(self._memory_cache) > self.MEMORY_CACHE_SIZE:
+                self._memory_cache.popitem(last=False)
+    
     def get_release_tracklist(self, release_id: int) -> List[Dict[str, Any]]:
         """
         Get the tracklist for a release.
@@ -137,93 +382,293 @@ class DiscogsAPIClient:
         if not release_data:
             return []
         
-        tracks = []
-        tracklist = release_data.get('tracklist', [])
+        return self._parse_tracklist(release_data, release_id)
+    
+    def get_release_tracklist_df(self, release_id: int) -> pd.DataFrame:
+        """
+        Get the tracklist for a release as a DataFrame.
+        
+        Columns are filled in one pass over the raw tracklist, without building
+        an intermediate dict per track.
+        
+        Args:
+            release_id: Discogs release ID
+            
+        Returns:
+            DataFrame with one row per tracklist entry (same fields as get_release_tracklist)
+        """
+        columns = {name: [] for name in _TRACK_FIELDS}
+        
+        release_data = self.get_release(release_id)
+        for track in (release_data or {}).get('tracklist', ()):
+            columns['position'].append(track.get('position', ''))
+            columns['title'].append(track.get('title', ''))
+            columns['duration'].append(track.get('duration', ''))
+            columns['type_'].append(track.get('type_', 'track'))
+            columns['artists'].append([artist.get('name', '') if isinstance(artist, dict) else str(artist)
+                                       for artist in track.get('artists') or ()])
+        columns['release_id'] = [release_id] * len(columns['position'])
         
-        for track in tracklist:
-            track_info = {
+        return pd.DataFrame(columns)
+    
+    async def get_release_tracklist_async(self, session: 'aiohttp.ClientSession',
+                                          release_id: int) -> List[Dict[str, Any]]:
+        """Async counterpart of get_release_tracklist."""
+        release_data = await self.get_release_async(session, release_id)
+        if not release_data:
+            return []
+        
+        return self._parse_tracklist(release_data, release_id)
+    
+    def _parse_tracklist(self, release_data: Dict[str, Any], release_id: int) -> List[Dict[str, Any]]:
+        """Convert a release's raw tracklist into track dictionaries."""
+        return [
+            {
                 'position': track.get('position', ''),
                 'title': track.get('title', ''),
                 'duration': track.get('duration', ''),
                 'type_': track.get('type_', 'track'),  # track, heading, etc.
-                'artists': self._extract_track_artists(track),
+                # Track-specific artists
+                'artists': [artist.get('name', '') if isinstance(artist, dict) else str(artist)
+                            for artist in track.get('artists') or ()],
                 'release_id': release_id
             }
-            tracks.append(track_info)
-        
-        return tracks
+            for track in release_data.get('tracklist', ())
+        ]
     
-    def batch_get_releases(self, release_ids: List[int], max_requests: int = 5) -> Dict[int, Dict[str, Any]]:
+    def batch_get_releases(self, release_ids: List[int], max_requests: int = 5,
+                           max_concurrency: int = 10) -> Dict[int, Dict[str, Any]]:
         """
         Get multiple releases with rate limiting.
         
+        Releases are fetched concurrently when aiohttp is installed (and no event
+        loop is already running), otherwise one at a time.
+        
         Args:
             release_ids: List of Discogs release IDs
             max_requests: Maximum number of API requests (for testing)
+            max_concurrency: Maximum number of in-flight requests on the async path
             
         Returns:
             Dictionary mapping release_id to release data
         """
-        results = {}
-        processed = 0
+        batch_ids = release_ids[:max_requests]
+        
+        logger.info(f"Fetching {len(batch_ids)} releases (limit: {max_requests})")
         
-        logger.info(f"Fetching {min(len(release_ids), max_requests)} releases (limit: {max_requests})")
+        results = self._read_cached_releases(batch_ids)
+        missing_ids = [release_id for release_id in batch_ids if release_id not in results]
         
-        for release_id in release_ids[:max_requests]:
+        if ASYNC_AVAILABLE and not _event_loop_running():
             try:
-                release_data = self.get_release(release_id)
-                if release_data:
-                    results[release_id] = release_data
-                    processed += 1
-                    logger.info(f"Progress: {processed}/{min(len(release_ids), max_requests)} releases fetched")
-                else:
-                    logger.warning(f"Failed to fetch release {release_id}")
-                    
+                asyncio.run(self._gather_releases(missing_ids, max_concurrency, results))
             except KeyboardInterrupt:
                 logger.info("Interrupted by user")
-                break
-            except Exception as e:
-                logger.error(f"Error processing release {release_id}: {e}")
-                continue
+        else:
+            for release_id in missing_ids:
+                try:
+                    release_data = self.get_release(release_id)
+                    if release_data:
+                        results[release_id] = release_data
+                        logger.info(f"Progress: {len(results)}/{len(batch_ids)} releases fetched")
+                    else:
+                        logger.warning(f"Failed to fetch release {release_id}")
+                        
+                except KeyboardInterrupt:
+                    logger.info("Interrupted by user")
+                    break
+                except Exception as e:
+                    logger.error(f"Error processing release {release_id}: {e}")
+                    continue
+        
+        self.save_rate_limit_state()
+        
+        # Cache hits and completion order are arbitrary; hand results back in request order
+        results = {release_id: results[release_id] for release_id in batch_ids if release_id in results}
+        logger.info(f"Batch completed: {len(results)} releases fetched successfully")
+        return results
+    
+    async def batch_get_releases_async(self, release_ids: List[int], max_requests: int = 5,
+                                       max_concurrency: int = 10) -> Dict[int, Dict[str, Any]]:
+        """Async counterpart of batch_get_releases, for callers already inside an event loop."""
+        batch_ids = release_ids[:max_requests]
+        
+        logger.info(f"Fetching {len(batch_ids)} releases (limit: {max_requests})")
+        results = await asyncio.to_thread(self._read_cached_releases, batch_ids)
+        missing_ids = [release_id for release_id in batch_ids if release_id not in results]
+        await self._gather_releases(missing_ids, max_concurrency, results)
+        self.save_rate_limit_state()
         
+        results = {release_id: results[release_id] for release_id in batch_ids if release_id in results}
         logger.info(f"Batch completed: {len(results)} releases fetched successfully")
         return results
     
+    def _read_cached_releases(self, release_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Load the cached subset of release_ids, reading files in parallel threads."""
+        cached_ids = [release_id for release_id in release_ids if release_id in self._cached_ids]
+        if not cached_ids:
+            return {}
+        
+        with ThreadPoolExecutor(max_workers=self.CACHE_READ_WORKERS) as pool:
+            releases = pool.map(lambda release_id: self._read_cache(release_id, self.cache_ttl_seconds), cached_ids)
+            results = {release_id: data for release_id, data in zip(cached_ids, releases) if data is not None}
+        
+        logger.info(f"Loaded {len(results)} releases from cache")
+        return results
+    
+    async def _gather_releases(self, release_ids: List[int], max_concurrency: int,
+                               results: Dict[int, Dict[str, Any]]):
+        """Fetch releases concurrently into results, so partial progress survives an interrupt."""
+        if not release_ids:
+            return
+        
+        total = len(results) + len(release_ids)  # results may already hold cache hits
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async with self.create_async_session() as session:
+            
+            async def fetch(release_id):
+                async with semaphore:
+                    release_data = await self.get_release_async(session, release_id)
+                if release_data:
+                    results[release_id] = release_data
+                    logger.info(f"Progress: {len(results)}/{total} releases fetched")
+                else:
+                    logger.warning(f"Failed to fetch release {release_id}")
+            
+            await asyncio.gather(*(fetch(release_id) for release_id in release_ids))
+    
     def _wait_for_rate_limit(self):
         """Ensure we don't exceed rate limits."""
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
+        sleep_time = self._reserve_request_slot()
         
-        if time_since_last < self.min_delay:
-            sleep_time = self.min_delay - time_since_last
-            logger.debug(f"Rate limiting: sleeping {sleep_time:.2f} seconds")
+        if sleep_time > 0:
+            logger.debug("Rate limiting: sleeping %.2f seconds", sleep_time)
             time.sleep(sleep_time)
+    
+    async def _wait_for_rate_limit_async(self):
+        """Wait for a request slot without blocking the event loop."""
+        sleep_time = self._reserve_request_slot()
         
-        self.last_request_time = time.time()
+        if sleep_time > 0:
+            logger.debug("Rate limiting: sleeping %.2f seconds", sleep_time)
+            await asyncio.sleep(sleep_time)
     
-    def _extract_track_artists(self, track: Dict[str, Any]) -> List[str]:
-        """Extract artist names from track data."""
-        artists = []
+    def _reserve_request_slot(self) -> float:
+        """
+        Take a token from the rate-limit bucket, returning seconds until it is usable.
         
-        # Track-specific artists
-        if 'artists' in track:
-            for artist in track['artists']:
-                if isinstance(artist, dict):
-                    artists.append(artist.get('name', ''))
-                else:
-                    artists.append(str(artist))
+        The bucket may go negative: each caller reserves the next token to be refilled,
+        so concurrent callers are spaced out rather than woken together.
+        """
+        with self._rate_lock:
+            self._refill_bucket()
+            self._bucket_tokens -= 1
+            tokens = self._bucket_tokens
+            save_due = self._bucket_last - self._bucket_saved_at >= self.BUCKET_SAVE_INTERVAL
+            if save_due:
+                self._bucket_saved_at = self._bucket_last
         
-        return artists
+        if save_due:
+            self._save_bucket_state(tokens)
+        return max(0.0, -tokens / self._refill_rate)
+    
+    def _refill_bucket(self):
+        """Add the tokens earned since the last update (caller holds _rate_lock)."""
+        now = time.monotonic()
+        self._bucket_tokens = min(self._bucket_capacity,
+                                  self._bucket_tokens + (now - self._bucket_last) * self._refill_rate)
+        self._bucket_last = now
+    
+    def _load_bucket_state(self):
+        """Restore the token count saved by a previous run, refilled for the time since."""
+        try:
+            state = json.loads(self._bucket_file.read_text(encoding='utf-8'))
+            elapsed = max(0.0, time.time() - state['saved_at'])
+            self._bucket_tokens = min(self._bucket_capacity, state['tokens'] + elapsed * self._refill_rate)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Error reading rate limit state: {e}")
+    
+    def save_rate_limit_state(self):
+        """Save the current token count, so the next run starts from the remaining budget."""
+        with self._rate_lock:
+            self._refill_bucket()
+            tokens = self._bucket_tokens
+            self._bucket_saved_at = self._bucket_last
+        
+        self._save_bucket_state(tokens)
+    
+    def close(self):
+        """Save the rate limit state and close the HTTP session."""
+        self.save_rate_limit_state()
+        self.session.close()
+    
+    def _save_bucket_state(self, tokens: float):
+        """Persist the token count (as of now) for the next run."""
+        state = json.dumps({'tokens': tokens, 'saved_at': time.time()})
+        tmp_file = self._bucket_file.with_name(f"{self._bucket_file.name}.{threading.get_ident()}.tmp")
+        try:
+            tmp_file.write_text(state, encoding='utf-8')
+            os.replace(tmp_file, self._bucket_file)
+        except OSError as e:
+            logger.debug("Could not save rate limit state: %s", e)
+    
+    def _handle_rate_limited(self, release_id: int, headers):
+        """
+        React to a 429 by emptying the token bucket for the server's Retry-After.
+        
+        Every caller (not just the one that was refused) then waits in
+        _wait_for_rate_limit before its next request.
+        """
+        try:
+            retry_after = float(headers.get('Retry-After', self.DEFAULT_RETRY_AFTER))
+        except ValueError:  # HTTP-date form
+            retry_after = self.DEFAULT_RETRY_AFTER
+        
+        logger.warning(f"Rate limit hit for release {release_id}, backing off {retry_after:.1f}s")
+        with self._rate_lock:
+            self._refill_bucket()
+            self._bucket_tokens = min(self._bucket_tokens, -retry_after * self._refill_rate)
+            tokens = self._bucket_tokens
+            self._bucket_saved_at = self._bucket_last
+        
+        # Saved straight away, so a run started during the back-off also waits
+        self._save_bucket_state(tokens)
     
     def get_cache_stats(self) -> Dict[str, int]:
         """Get statistics about cached data."""
-        cache_files = list(self.cache_dir.glob("release_*.json"))
+        cached_releases = 0
+        cache_bytes = 0
+        
+        # scandir entries come with their stat info, avoiding a Path and syscall per file
+        with os.scandir(self.cache_dir) as entries:
+            for entry in entries:
+                if entry.name.startswith('release_') and entry.name.endswith('.json'):
+                    cached_releases += 1
+                    cache_bytes += entry.stat().st_size
+        
         return {
-            'cached_releases': len(cache_files),
-            'cache_size_mb': sum(f.stat().st_size for f in cache_files) / (1024 * 1024)
+            'cached_releases': cached_releases,
+            'cache_size_mb': cache_bytes / (1024 * 1024)
         }
 
 
+def _loads(raw: bytes) -> Any:
+    """Parse JSON bytes directly (no text decode step), with orjson when available."""
+    return orjson.loads(raw) if orjson else json.loads(raw)
+
+
+def _event_loop_running() -> bool:
+    """Whether the current thread is already running an asyncio event loop."""
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
 def load_api_key_from_env() -> Optional[str]:
     """Load Discogs API key from environment variables."""
     from dotenv import load_dotenv
@@ -9,26 +9,81 @@ Created: June 12, 2025
 """
 
 import pandas as pd
+import numpy as np
+import hashlib
+import re
+import pickle
 from pathlib import Path
 from typing import List, Dict, Optional
 import logging
 
+# pandas' pyarrow engine already parses with Arrow's multithreaded reader. Calling
+# pyarrow.csv directly (or keeping ArrowDtype columns) would change the dtypes that
+# the rest of the app and the SQLite writer expect, so we stay on pd.read_csv.
+try:
+    import pyarrow  # noqa: F401 - only needed for pandas' multithreaded CSV engine
+    _CSV_ENGINE = 'pyarrow'
+except ImportError:
+    _CSV_ENGINE = 'c'
+
 logger = logging.getLogger(__name__)
 
+# Bump whenever parse() output changes so stale cached DataFrames are ignored
+PARSE_CACHE_VERSION = 3
+
+# A 19xx/20xx year anywhere in a "Released" value
+_YEAR_RE = re.compile(r'\b((?:19|20)\d{2})\b')
+
+# Format keywords in priority order (first match wins). Each group sits in its own
+# lookahead from the start of the string, so all of them are tested regardless of
+# where in the string they occur.
+_FORMAT_KEYWORDS = [
+    ('LP', ['lp']),
+    ('12"', ['12"', '12 inch']),
+    ('7"', ['7"', '7 inch']),
+    ('CD', ['cd']),
+    ('Cassette', ['cassette', 'tape']),
+]
+_FORMAT_RE = re.compile(
+    '^' + ''.join(f"(?:(?=.*?({'|'.join(map(re.escape, keywords))})))?" for _, keywords in _FORMAT_KEYWORDS),
+    re.IGNORECASE | re.DOTALL
+)
+_FORMAT_TYPES = np.array([format_type for format_type, _ in _FORMAT_KEYWORDS])
+
+# Discogs CSV columns we use, mapped to our standard naming
+DISCOGS_COLUMNS = {
+    'Catalog#': 'catalog_number',
+    'Artist': 'artist', 
+    'Title': 'title',
+    'Label': 'label',
+    'Format': 'format',
+    'Rating': 'rating',
+    'Released': 'released',
+    'release_id': 'release_id',
+    'CollectionFolder': 'collection_folder',
+    'Date Added': 'date_added',
+    'Collection Media Condition': 'media_condition',
+    'Collection Sleeve Condition': 'sleeve_condition',
+    'Collection Notes': 'notes'
+}
+
 
 class DiscogsCSVParser:
     """Parser for Discogs collection CSV export files."""
     
-    def __init__(self, csv_file_path: str):
+    def __init__(self, csv_file_path: str, cache_dir: Optional[str] = "./data/.cache"):
         """
         Initialize the Discogs CSV parser.
         
         Args:
             csv_file_path: Path to the Discogs CSV export file
+            cache_dir: Directory for caching parsed output (None to disable)
         """
         self.csv_file_path = Path(csv_file_path)
         if not self.csv_file_path.exists():
             raise FileNotFoundError(f"Discogs CSV file not found: {csv_file_path}")
+        
+        self.cache_dir = Path(cache_dir) if cache_dir else None
     
     def parse(self) -> pd.DataFrame:
         """
@@ -50,11 +105,19 @@ class DiscogsCSVParser:
             - sleeve_condition: Sleeve condition
             - notes: Collection notes
         """
+        cached = self._read_cache()
+        if cached is not None:
+            return cached
+        
         logger.info(f"Parsing Discogs CSV file: {self.csv_file_path}")
         
         try:
-            # Read CSV file
-            df = pd.read_csv(str(self.csv_file_path))
+            # Read CSV file, skipping columns we never use (exports can carry custom fields)
+            header = pd.read_csv(self.csv_file_path, nrows=0).columns
+            usecols = [col for col in header if col in DISCOGS_COLUMNS]
+            # No dtype overrides: the pyarrow engine applies them as casts after reading,
+            # which fails on the blank Rating/Released cells common in exports
+            df = pd.read_csv(self.csv_file_path, usecols=usecols, engine=_CSV_ENGINE)
             logger.info(f"Found {len(df)} releases in Discogs CSV")
             
             # Clean and standardize column names
@@ -64,34 +127,60 @@ class DiscogsCSVParser:
             df = self._normalize_data(df)
             
             logger.info(f"Successfully parsed {len(df)} releases")
+            self._write_cache(df)
             return df
             
         except Exception as e:
             logger.error(f"Error parsing Discogs CSV file: {e}")
             raise
     
+    def _cache_file(self) -> Path:
+        """Cache location for this CSV (one file per source path)."""
+        path_hash = hashlib.sha1(str(self.csv_file_path.resolve()).encode('utf-8')).hexdigest()[:16]
+        return self.cache_dir / f"discogs_{path_hash}.pkl"
+    
+    def _cache_key(self) -> tuple:
+        """Key that changes whenever the CSV is modified or the parser output changes."""
+        stat = self.csv_file_path.stat()
+        return (PARSE_CACHE_VERSION, stat.st_mtime_ns, stat.st_size)
+    
+    def _read_cache(self) -> Optional[pd.DataFrame]:
+        """Return the cached parse result if it matches the current CSV."""
+        if self.cache_dir is None:
+            return None
+        
+        cache_file = self._cache_file()
+        if not cache_file.exists():
+            return None
+        
+        try:
+            with open(cache_file, 'rb') as f:
+                cached = pickle.load(f)
+            if cached['key'] != self._cache_key():
+                return None
+            logger.info(f"Loaded {len(cached['releases'])} releases from parse cache: {cache_file}")
+            return cached['releases']
+        except Exception as e:
+            logger.warning(f"Error reading parse cache {cache_file}: {e}")
+            return None
+    
+    def _write_cache(self, df: pd.DataFrame):
+        """Store the parse result alongside the key it was computed for."""
+        if self.cache_dir is None:
+            return
+        
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with open(self._cache_file(), 'wb') as f:
+                pickle.dump({'key': self._cache_key(), 'releases': df}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logger.warning(f"Error writing parse cache: {e}")
+    
     def _clean_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
         """Clean and standardize the DataFrame columns."""
         
-        # Map Discogs CSV columns to our standard naming
-        column_mapping = {
-            'Catalog#': 'catalog_number',
-            'Artist': 'artist', 
-            'Title': 'title',
-            'Label': 'label',
-            'Format': 'format',
-            'Rating': 'rating',
-            'Released': 'released',
-            'release_id': 'release_id',
-            'CollectionFolder': 'collection_folder',
-            'Date Added': 'date_added',
-            'Collection Media Condition': 'media_condition',
-            'Collection Sleeve Condition': 'sleeve_condition',
-            'Collection Notes': 'notes'
-        }
-        
         # Rename columns
-        df = df.rename(columns=column_mapping)
+        df = df.rename(columns=DISCOGS_COLUMNS)
         
         # Fill NaN values with empty strings for text columns
         text_columns = ['catalog_number', 'artist', 'title', 'label', 'format', 
@@ -103,112 +192,84 @@ class DiscogsCSVParser:
         return df
     
     def _normalize_data(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Normalize and clean the data."""
+        """Normalize and clean the data (whole-column string operations, no per-row Python)."""
         
         # Clean catalog numbers - handle multiple formats
         if 'catalog_number' in df.columns:
-            df['catalog_number_clean'] = df['catalog_number'].apply(self._clean_catalog_number)
+            df['catalog_number_clean'] = self._clean_catalog_numbers(df['catalog_number'])
         
         # Parse release year
         if 'released' in df.columns:
-            df['release_year'] = df['released'].apply(self._parse_release_year)
+            df['release_year'] = self._parse_release_years(df['released'])
         
         # Clean artist names
         if 'artist' in df.columns:
-            df['artist_clean'] = df['artist'].apply(self._clean_artist_name)
+            df['artist_clean'] = self._clean_artist_names(df['artist'])
         
         # Extract format info
         if 'format' in df.columns:
-            df['format_type'] = df['format'].apply(self._extract_format_type)
-            df['format_description'] = df['format'].apply(self._extract_format_description)
+            df['format_type'] = self._extract_format_types(df['format'])
+            df['format_description'] = self._extract_format_descriptions(df['format'])
         
         # Convert date_added to datetime
         if 'date_added' in df.columns:
-            df['date_added'] = pd.to_datetime(df['date_added'], errors='coerce')
+            df['date_added'] = pd.to_datetime(df['date_added'], format='%Y-%m-%d %H:%M:%S', errors='coerce')
         
         return df
     
-    def _clean_catalog_number(self, catalog_num: str) -> str:
+    def _clean_catalog_numbers(self, catalog_nums: pd.Series) -> pd.Series:
         """Clean and standardize catalog numbers."""
-        if not catalog_num or catalog_num == 'nan':
-            return ''
-        
         # Remove extra quotes and whitespace
-        catalog_clean = str(catalog_num).strip().strip('"')
+        catalog_clean = catalog_nums.str.strip().str.strip('"')
         
-        # Handle multiple catalog numbers (comma or space separated)
-        if ',' in catalog_clean:
-            # Take the first one for primary key
-            catalog_clean = catalog_clean.split(',')[0].strip()
+        # Handle multiple catalog numbers (comma separated): take the first one for primary key
+        has_multiple = catalog_clean.str.contains(',', regex=False)
+        catalog_clean = catalog_clean.where(~has_multiple, catalog_clean.str.split(',', n=1).str[0].str.strip())
         
-        return catalog_clean
+        return catalog_clean.mask(catalog_nums == 'nan', '')
     
-    def _parse_release_year(self, released: str) -> int:
-        """Extract release year from various date formats."""
-        if not released or str(released) == 'nan':
-            return 0
+    def _parse_release_years(self, released: pd.Series) -> pd.Series:
+        """Extract release years from various date formats (0 when unknown)."""
+        year_str = released.astype(str).str.strip()
         
-        try:
-            # Convert to string and extract year
-            year_str = str(released).strip()
-            if year_str.isdigit() and len(year_str) == 4:
-                return int(year_str)
-            else:
-                # Try to extract 4-digit year from string
-                import re
-                year_match = re.search(r'\b(19|20)\d{2}\b', year_str)
-                if year_match:
-                    return int(year_match.group())
-        except (ValueError, AttributeError):
-            pass
-        
-        return 0
+        # A bare 4-digit value is taken as-is; otherwise look for a 19xx/20xx year in the string
+        is_year = year_str.str.fullmatch(r'\d{4}')
+        extracted = year_str.str.extract(_YEAR_RE.pattern, expand=False)
+        years = year_str.where(is_year, extracted)
+        
+        return pd.to_numeric(years, errors='coerce').fillna(0).astype(int)
     
-    def _clean_artist_name(self, artist: str) -> str:
+    def _clean_artist_names(self, artists: pd.Series) -> pd.Series:
         """Clean and normalize artist names."""
-        if not artist or artist == 'nan':
-            return ''
-        
-        artist_clean = str(artist).strip()
+        # Remove extra whitespace
+        artist_clean = artists.str.split().str.join(' ').astype(str)
         
         # Handle "Various" artists
-        if artist_clean.lower() in ['various', 'various artists']:
-            return 'Various'
+        is_various = artists.str.strip().str.lower().isin(['various', 'various artists'])
+        artist_clean = artist_clean.mask(is_various, 'Various')
         
-        # Remove extra whitespace
-        artist_clean = ' '.join(artist_clean.split())
-        
-        return artist_clean
+        return artist_clean.mask(artists == 'nan', '')
     
-    def _extract_format_type(self, format_str: str) -> str:
+    def _extract_format_types(self, formats: pd.Series) -> pd.Series:
         """Extract the primary format type (LP, 12", CD, etc.)."""
-        if not format_str or format_str == 'nan':
-            return ''
-        
-        format_lower = str(format_str).lower()
-        
-        # Common format patterns
-        if 'lp' in format_lower:
-            return 'LP'
-        elif '12"' in format_str or '12 inch' in format_lower:
-            return '12"'
-        elif '7"' in format_str or '7 inch' in format_lower:
-            return '7"'
-        elif 'cd' in format_lower:
-            return 'CD'
-        elif 'cassette' in format_lower or 'tape' in format_lower:
-            return 'Cassette'
-        else:
-            return 'Other'
+        # Exports repeat a small set of format strings, so classify each distinct value once
+        codes, unique_formats = pd.factorize(formats)
+        format_types = self._classify_formats(pd.Series(unique_formats, dtype=formats.dtype))
+        
+        return pd.Series(format_types[codes], index=formats.index)
     
-    def _extract_format_description(self, format_str: str) -> str:
-        """Extract detailed format description."""
-        if not format_str or format_str == 'nan':
-            return ''
+    def _classify_formats(self, formats: pd.Series) -> np.ndarray:
+        """Map each format string to its primary format type."""
+        # One regex pass: column i is non-null when keyword group i occurs anywhere
+        matches = formats.str.extract(_FORMAT_RE).notna().to_numpy()
+        format_types = np.where(matches.any(axis=1), _FORMAT_TYPES[matches.argmax(axis=1)], 'Other')
         
+        return np.where((formats == '') | (formats == 'nan'), '', format_types)
+    
+    def _extract_format_descriptions(self, formats: pd.Series) -> pd.Series:
+        """Extract detailed format descriptions."""
         # Clean up format string
-        desc = str(format_str).strip().strip('"')
-        return desc
+        return formats.str.strip().str.strip('"').mask(formats == 'nan', '')
 
 
 if __name__ == "__main__":
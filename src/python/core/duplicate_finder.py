@@ -8,22 +8,83 @@ Author: MusicTool MVP
 Created: June 12, 2025
 """
 
+import numpy as np
 import pandas as pd
-from typing import Dict, List, Tuple, Optional, Set
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
 import logging
-from fuzzywuzzy import fuzz
-import re
-from collections import defaultdict
+from rapidfuzz import fuzz
+import os
 import time
 
 from .nml_parser import NMLParser
+from .text_matching import normalize_text, score_matrix
 
 logger = logging.getLogger(__name__)
 
 
+def _find_roots(parent: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+    """Follow union-find parent links from the given nodes up to their roots."""
+    roots = parent[nodes]
+    while True:
+        next_roots = parent[roots]
+        if np.array_equal(next_roots, roots):
+            return roots
+        roots = next_roots
+
+
+def _union_pairs(parent: np.ndarray, left: np.ndarray, right: np.ndarray) -> None:
+    """
+    Merge the components of each (left, right) pair in a numpy union-find, in place.
+    
+    The larger root is always linked under the smaller one, so every root is the
+    smallest node of its component. Pairs whose roots clash within one round are
+    retried until every pair shares a root.
+    """
+    while len(left):
+        left_roots = _find_roots(parent, left)
+        right_roots = _find_roots(parent, right)
+        pending = left_roots != right_roots
+        if not pending.any():
+            break
+        
+        low = np.minimum(left_roots[pending], right_roots[pending])
+        high = np.maximum(left_roots[pending], right_roots[pending])
+        np.minimum.at(parent, high, low)
+        left, right = low, high
+    
+    # Path compression keeps later lookups short
+    parent[:] = _find_roots(parent, np.arange(len(parent)))
+
+
+@dataclass
+class TrackArrays:
+    """Struct-of-arrays view of the collection fields read by the duplicate scan.
+    
+    Every array is indexed by collection position.
+    """
+    artist: np.ndarray
+    title: np.ndarray
+    artist_title: np.ndarray
+    filename: np.ndarray
+    extension: np.ndarray
+    duration: np.ndarray
+    track_index: np.ndarray
+    record_fields: Dict[str, np.ndarray]
+    factorized: Dict[str, Tuple[np.ndarray, np.ndarray]]
+
+
 class DuplicateFinder:
     """Finds potential duplicate tracks in digital music collections."""
     
+    # Reference rows scored per process.cdist call (bounds the score matrix size)
+    SCORE_BLOCK_ROWS = 256
+    # Threads used by process.cdist (-1 = all cores)
+    SCORER_WORKERS = -1
+    # Track fields copied into duplicate records
+    RECORD_COLUMNS = ['artist', 'title', 'album', 'genre', 'bpm', 'totaltime', 'bitrate', 'filetype',
+                      'filesize', 'location', 'dateadded', 'playcount']
+    
     def __init__(self, nml_path: str):
         """
         Initialize the Duplicate Finder.
@@ -33,10 +94,12 @@ class DuplicateFinder:
         """
         self.nml_path = nml_path
         self.digital_collection = self._load_digital_collection()
+        self.track_arrays = self._build_track_arrays() if not self.digital_collection.empty else None
         
         logger.info(f"Duplicate Finder initialized with {len(self.digital_collection)} tracks")
     
-    def find_duplicates(self, similarity_threshold: int = 85, group_by: str = "artist_title") -> pd.DataFrame:
+    def find_duplicates(self, similarity_threshold: int = 85, group_by: str = "artist_title",
+                        blocking: bool = False) -> pd.DataFrame:
         """
         Find potential duplicate tracks in the digital collection.
         
@@ -47,9 +110,13 @@ class DuplicateFinder:
                      - "title_only": Group by title similarity only
                      - "filename": Group by filename similarity
                      - "duration": Group by similar duration and title
+            blocking: Only compare tracks sharing a cheap blocking key (see
+                     _block_keys). Much faster on large collections, but pairs
+                     that fall into different blocks are never compared.
             
         Returns:
-            DataFrame with duplicate groups and similarity scores
+            DataFrame with duplicate groups and similarity scores. Groups are the
+            connected components of all above-threshold pairs.
         """
         logger.info(f"Starting duplicate search (threshold: {similarity_threshold}%, method: {group_by})")
         start_time = time.time()
@@ -58,38 +125,49 @@ class DuplicateFinder:
             logger.warning("No digital collection data found")
             return pd.DataFrame()
         
-        duplicate_groups = []
-        processed_tracks = set()
+        tracks = self.track_arrays
+        total_tracks = len(self.digital_collection)
         
-        # Process each track
-        for idx, track in self.digital_collection.iterrows():
-            if idx in processed_tracks:
-                continue
-                
-            # Find similar tracks
-            similar_tracks = self._find_similar_tracks(
-                track, idx, similarity_threshold, group_by, processed_tracks
+        if blocking:
+            keys = pd.Series(self._block_keys(tracks, group_by))
+            blocks = [positions for positions in keys.groupby(keys, sort=False).indices.values()
+                      if len(positions) > 1]
+            logger.info(f"  Comparing within {len(blocks)} blocks")
+        else:
+            blocks = [np.arange(total_tracks)]
+        
+        # Tracks only group with tracks from their own block, so each block can
+        # be grouped independently and the groups merged in collection order
+        groups = []
+        for positions in blocks:
+            groups.extend(self._group_block(tracks, positions, similarity_threshold, group_by))
+        groups.sort(key=lambda group: group[0])
+        
+        # Read record fields straight from the column arrays instead of building
+        # a Series per row
+        def track_at(pos: int) -> Dict:
+            return {column: values[pos] for column, values in tracks.record_fields.items()}
+        
+        duplicate_groups = []
+        for ref_pos, similar_tracks in groups:
+            # Create duplicate group
+            group_id = len(duplicate_groups) + 1
+            
+            # Add the original track
+            duplicate_groups.append(
+                self._create_duplicate_record(
+                    track_at(ref_pos), tracks.track_index[ref_pos], group_id, 1, 100.0, "original"
+                )
             )
             
-            if similar_tracks:
-                # Create duplicate group
-                group_id = len(duplicate_groups) + 1
-                
-                # Add the original track
-                duplicate_groups.append(self._create_duplicate_record(track, idx, group_id, 1, 100.0, "original"))
-                
-                # Add similar tracks
-                for similar_track, similar_idx, similarity_score in similar_tracks:
-                    duplicate_groups.append(
-                        self._create_duplicate_record(
-                            similar_track, similar_idx, group_id, 
-                            len([t for t in similar_tracks if t[2] >= similarity_score]) + 2,
-                            similarity_score, "duplicate"
-                        )
+            # Add similar tracks (already sorted by score, so rank follows list order)
+            for rank, (similar_pos, similarity_score) in enumerate(similar_tracks, start=2):
+                duplicate_groups.append(
+                    self._create_duplicate_record(
+                        track_at(similar_pos), tracks.track_index[similar_pos], group_id,
+                        rank, similarity_score, "duplicate"
                     )
-                    processed_tracks.add(similar_idx)
-                
-                processed_tracks.add(idx)
+                )
         
         # Convert to DataFrame
         duplicates_df = pd.DataFrame(duplicate_groups)
@@ -106,81 +184,187 @@ class DuplicateFinder:
         
         return duplicates_df
     
-    def _find_similar_tracks(self, reference_track: pd.Series, ref_idx: int, 
-                           threshold: int, method: str, processed: Set[int]) -> List[Tuple]:
-        """Find tracks similar to the reference track."""
-        similar_tracks = []
-        
-        # Normalize reference track data
-        ref_artist = self._normalize_text(reference_track['artist'])
-        ref_title = self._normalize_text(reference_track['title'])
-        ref_filename = self._normalize_filename(reference_track.get('location', ''))
-        ref_duration = reference_track.get('totaltime', 0)
-        
-        # Search through remaining tracks
-        for idx, track in self.digital_collection.iterrows():
-            if idx <= ref_idx or idx in processed:
-                continue
+    def _group_block(self, tracks: TrackArrays, positions: np.ndarray,
+                     threshold: int, method: str) -> List[Tuple[int, List[Tuple[int, float]]]]:
+        """
+        Cluster the tracks at the given positions into duplicate groups.
+        
+        Every pair scoring at least the threshold is an edge; groups are the
+        connected components of that graph (union-find), so membership does not
+        depend on which track happens to be scanned first.
+        
+        Args:
+            tracks: Track arrays of the collection
+            positions: Sorted collection positions to compare with each other
+            threshold: Minimum similarity score
+            method: Grouping method (see find_duplicates)
             
-            # Calculate similarity based on method
-            similarity_score = self._calculate_similarity(
-                reference_track, track, method, 
-                ref_artist, ref_title, ref_filename, ref_duration
+        Returns:
+            List of (reference position, [(similar position, score), ...]) tuples.
+            The reference is the group's first track in collection order; each
+            other member's score is its strongest link within the group, and
+            members are sorted by score (highest first)
+        """
+        parent = np.arange(len(positions))
+        best_scores = np.zeros(len(positions))
+        
+        # Score a chunk of reference rows at a time; each chunk only needs the
+        # columns from its first row onwards
+        for chunk_start in range(0, len(positions), self.SCORE_BLOCK_ROWS):
+            chunk_end = min(chunk_start + self.SCORE_BLOCK_ROWS, len(positions))
+            chunk_scores = self._score_block(
+                tracks, positions[chunk_start:chunk_end], positions[chunk_start:], method, threshold
             )
             
-            if similarity_score >= threshold:
-                similar_tracks.append((track, idx, similarity_score))
+            # Keep only the pairs at or above the threshold to the right of the
+            # diagonal, as sparse (left, right) index pairs
+            linked = np.triu(chunk_scores >= threshold, k=1)
+            pair_rows, pair_columns = np.nonzero(linked)
+            if not len(pair_rows):
+                continue
+            _union_pairs(parent, pair_rows + chunk_start, pair_columns + chunk_start)
+            
+            # Strongest link of every track seen so far, from both sides of each pair
+            linked_scores = np.where(linked, chunk_scores, 0)
+            best_scores[chunk_start:chunk_end] = np.maximum(best_scores[chunk_start:chunk_end],
+                                                            linked_scores.max(axis=1))
+            best_scores[chunk_start:] = np.maximum(best_scores[chunk_start:], linked_scores.max(axis=0))
+        
+        nodes = np.arange(len(positions))
+        roots = _find_roots(parent, nodes)
+        
+        # Roots are the smallest position of their component, so walking the
+        # members in order yields groups sorted by reference position
+        members_by_root: Dict[int, List[Tuple[int, float]]] = {}
+        for node in np.flatnonzero(roots != nodes):
+            members_by_root.setdefault(int(roots[node]), []).append(
+                (int(positions[node]), float(best_scores[node]))
+            )
         
-        # Sort by similarity score (highest first)
-        similar_tracks.sort(key=lambda x: x[2], reverse=True)
+        groups = []
+        for root, similar_tracks in members_by_root.items():
+            # Sort by similarity score (highest first)
+            similar_tracks.sort(key=lambda x: x[1], reverse=True)
+            groups.append((int(positions[root]), similar_tracks))
         
-        return similar_tracks
+        return groups
     
-    def _calculate_similarity(self, track1: pd.Series, track2: pd.Series, method: str,
-                            ref_artist: str, ref_title: str, ref_filename: str, ref_duration: float) -> float:
-        """Calculate similarity score between two tracks based on the specified method."""
+    def _build_track_arrays(self) -> TrackArrays:
+        """Extract the fields the duplicate scan reads into positional arrays."""
+        df = self.digital_collection
+        durations = df['totaltime'] if 'totaltime' in df.columns else np.zeros(len(df))
+        locations = df['location'].fillna('') if 'location' in df.columns else [''] * len(df)
         
-        # Normalize track2 data
-        artist2 = self._normalize_text(track2['artist'])
-        title2 = self._normalize_text(track2['title'])
-        filename2 = self._normalize_filename(track2.get('location', ''))
-        duration2 = track2.get('totaltime', 0)
+        text_fields = {
+            'artist': df['_norm_artist'].to_numpy(dtype=object),
+            'title': df['_norm_title'].to_numpy(dtype=object),
+            'artist_title': df['_norm_artist_title'].to_numpy(dtype=object),
+            'filename': df['_norm_filename'].to_numpy(dtype=object),
+        }
         
-        if method == "artist_title":
-            # Combined artist and title similarity
-            artist_sim = fuzz.ratio(ref_artist, artist2)
-            title_sim = fuzz.ratio(ref_title, title2)
-            combined_sim = fuzz.ratio(f"{ref_artist} {ref_title}", f"{artist2} {title2}")
+        return TrackArrays(
+            **text_fields,
+            extension=np.array([os.path.splitext(str(loc))[1].lower() for loc in locations], dtype=object),
+            duration=np.asarray(durations, dtype=float),
+            track_index=df.index.to_numpy(),
+            record_fields={
+                column: df[column].to_numpy() for column in self.RECORD_COLUMNS if column in df.columns
+            },
+            # Integer codes into the distinct strings of each text field, so repeated
+            # values (artists especially) are only scored once
+            factorized={name: pd.factorize(values) for name, values in text_fields.items()},
+        )
+    
+    def _block_keys(self, tracks: TrackArrays, method: str) -> List[str]:
+        """
+        Build the blocking key of every track for the given grouping method.
+        
+        Filenames are blocked by extension; the other methods by the first two
+        characters of the artist (or title) plus a coarse title-length bucket.
+        """
+        if method == "filename":
+            return list(tracks.extension)
+        
+        prefixes = tracks.artist if method == "artist_title" else tracks.title
+        return [f"{prefix[:2]}|{len(title) // 4}" for prefix, title in zip(prefixes, tracks.title)]
+    
+    def _score_block(self, tracks: TrackArrays, rows: np.ndarray, columns: np.ndarray,
+                     method: str, threshold: float = 0) -> np.ndarray:
+        """
+        Score the tracks at the row positions against the tracks at the column positions.
+        
+        Args:
+            tracks: Track arrays of the collection
+            rows: Reference track positions
+            columns: Candidate track positions
+            method: Grouping method (see find_duplicates)
+            threshold: Scores that cannot reach this value may be reported lower
+                      than their true value (they are zeroed by RapidFuzz)
             
-            # Weighted average (title more important)
-            return (title_sim * 0.5) + (artist_sim * 0.3) + (combined_sim * 0.2)
+        Returns:
+            Array of shape (len(rows), len(columns)) with similarity scores
+        """
+        def ratio_matrix(field: str, weight: float = 1.0, scorer=fuzz.ratio) -> np.ndarray:
+            # A component scoring below this cannot lift the weighted total to the
+            # threshold even if every other component is a perfect 100, so RapidFuzz
+            # may abandon it early. One point of slack covers RapidFuzz rounding the
+            # cutoff when converting it to an edit distance.
+            cutoff = max(0.0, (threshold - 100 * (1 - weight)) / weight - 1)
             
+            # Score each distinct string pair once, then expand back to track positions.
+            # Scores are whole numbers (0-100), so uint8 holds them in an eighth of
+            # the memory of float64. Blank strings score 0 against everything.
+            codes, uniques = tracks.factorized[field]
+            row_codes, row_inverse = np.unique(codes[rows], return_inverse=True)
+            column_codes, column_inverse = np.unique(codes[columns], return_inverse=True)
+            scores = score_matrix(uniques[row_codes], uniques[column_codes], scorer=scorer,
+                                  dtype=np.uint8, score_cutoff=cutoff, workers=self.SCORER_WORKERS)
+            return scores[np.ix_(row_inverse.ravel(), column_inverse.ravel())]
+        
+        # Token set ratio ignores word order and extra words ("artist feat x" vs
+        # "x artist"); the normalized strings are already lowercased and split on
+        # single spaces, so no processor is needed
+        token_set = fuzz.token_set_ratio
+        
+        if method == "artist_title":
+            # Weighted average (title more important)
+            return ((ratio_matrix('title', 0.5, token_set) * 0.5) + (ratio_matrix('artist', 0.3, token_set) * 0.3)
+                    + (ratio_matrix('artist_title', 0.2, token_set) * 0.2))
+        
         elif method == "title_only":
-            # Title similarity only
-            return fuzz.ratio(ref_title, title2)
-            
+            return ratio_matrix('title', scorer=token_set)
+        
         elif method == "filename":
-            # Filename similarity
-            return fuzz.ratio(ref_filename, filename2)
-            
+            return ratio_matrix('filename')
+        
         elif method == "duration":
-            # Duration + title similarity
-            title_sim = fuzz.ratio(ref_title, title2)
+            scores = ratio_matrix('title', 0.7) * 0.7
+            ref_durations = tracks.duration[rows]
+            durations = tracks.duration[columns]
+            ref_known = ref_durations > 0
+            known = durations > 0
+            if not (ref_known.any() and known.any()):
+                # No comparable durations: the duration term is zero everywhere
+                return scores
             
-            # Duration similarity (within 5 seconds = high similarity)
-            if ref_duration > 0 and duration2 > 0:
-                duration_diff = abs(ref_duration - duration2) / 1000  # Convert to seconds
-                duration_sim = max(0, 100 - (duration_diff * 5))  # 5% penalty per second difference
-                duration_sim = min(100, duration_sim)
-            else:
-                duration_sim = 0
+            # Duration similarity (within 5 seconds = high similarity), computed in
+            # place over one broadcast matrix
+            duration_sim = np.subtract.outer(ref_durations, durations)
+            np.abs(duration_sim, out=duration_sim)
+            duration_sim /= 1000  # Convert to seconds
+            duration_sim *= 5  # 5% penalty per second difference
+            np.subtract(100, duration_sim, out=duration_sim)
+            np.clip(duration_sim, 0, 100, out=duration_sim)
+            duration_sim[~(ref_known[:, np.newaxis] & known[np.newaxis, :])] = 0
             
             # Combined score
-            return (title_sim * 0.7) + (duration_sim * 0.3)
+            duration_sim *= 0.3
+            scores += duration_sim
+            return scores
         
-        return 0
+        return np.zeros((len(rows), len(columns)))
     
-    def _create_duplicate_record(self, track: pd.Series, track_idx: int, group_id: int, 
+    def _create_duplicate_record(self, track: Dict, track_idx: int, group_id: int, 
                                rank: int, similarity: float, status: str) -> Dict:
         """Create a duplicate record for the results DataFrame."""
         return {
@@ -205,35 +389,20 @@ class DuplicateFinder:
     
     def _normalize_text(self, text: str) -> str:
         """Normalize text for better matching."""
-        if not text or pd.isna(text):
-            return ''
-        
-        # Convert to lowercase
-        text = str(text).lower()
-        
-        # Remove common prefixes/suffixes
-        text = re.sub(r'\b(the|a|an)\b', '', text)
-        text = re.sub(r'\(.*?\)', '', text)  # Remove parentheses content
-        text = re.sub(r'\[.*?\]', '', text)  # Remove bracket content
-        text = re.sub(r'\s*-\s*(remix|edit|mix|version|remaster|remastered)\b.*', '', text)
-        
-        # Remove special characters and extra spaces
-        text = re.sub(r'[^\w\s]', ' ', text)
-        text = re.sub(r'\s+', ' ', text)
-        text = text.strip()
-        
-        return text
+        return normalize_text(text, strip_remix=True)
     
     def _normalize_filename(self, filepath: str) -> str:
         """Normalize filename for comparison."""
         if not filepath or pd.isna(filepath):
             return ''
         
-        # Extract filename from path
-        filename = filepath.split('/')[-1].split('\\')[-1]
+        # Extract filename from path (Traktor paths may use either separator)
+        filename = os.path.basename(filepath.replace('\\', '/'))
         
         # Remove extension
-        filename = re.sub(r'\.[^.]*$', '', filename)
+        stem, dot, _ = filename.rpartition('.')
+        if dot:
+            filename = stem
         
         # Normalize like text
         return self._normalize_text(filename)
@@ -243,6 +412,14 @@ class DuplicateFinder:
         try:
             parser = NMLParser(self.nml_path)
             df = parser.parse()
+            
+            # Normalize the matching fields once instead of per comparison
+            df['_norm_artist'] = df['artist'].map(self._normalize_text)
+            df['_norm_title'] = df['title'].map(self._normalize_text)
+            df['_norm_artist_title'] = df['_norm_artist'] + ' ' + df['_norm_title']
+            locations = df['location'] if 'location' in df.columns else pd.Series('', index=df.index)
+            df['_norm_filename'] = locations.map(self._normalize_filename)
+            
             logger.info(f"Loaded {len(df)} digital tracks from NML")
             return df
         except Exception as e:
@@ -256,15 +433,13 @@ class DuplicateFinder:
         
         total_groups = duplicates_df['group_id'].nunique()
         total_duplicates = len(duplicates_df)
-        potential_space_saved = 0
-        
-        # Calculate potential space savings
-        for group_id in duplicates_df['group_id'].unique():
-            group_tracks = duplicates_df[duplicates_df['group_id'] == group_id]
-            if len(group_tracks) > 1:
-                # Assume we keep the largest file and remove others
-                filesizes = group_tracks['filesize'].astype(float)
-                potential_space_saved += filesizes.sum() - filesizes.max()
+        
+        # Calculate potential space savings in one groupby pass
+        # (assume we keep the largest file of each group and remove others)
+        filesizes = duplicates_df['filesize'].astype(float)
+        group_sizes = filesizes.groupby(duplicates_df['group_id']).agg(['sum', 'max', 'size'])
+        multi_track_groups = group_sizes[group_sizes['size'] > 1]
+        potential_space_saved = (multi_track_groups['sum'] - multi_track_groups['max']).sum()
         
         # Top duplicate artists/albums
         duplicate_tracks = duplicates_df[duplicates_df['status'] == 'duplicate']
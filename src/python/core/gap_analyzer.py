@@ -8,14 +8,13 @@ Author: MusicTool MVP
 Created: June 12, 2025
 """
 
+import numpy as np
 import pandas as pd
 from typing import Dict, List, Tuple, Optional
 import logging
-from fuzzywuzzy import fuzz
-from fuzzywuzzy import process
-import re
 
 from .nml_parser import NMLParser
+from .text_matching import is_blank, normalize_text, score_matrix
 from .collection_expander import CollectionExpander, load_api_key_from_env
 
 logger = logging.getLogger(__name__)
@@ -24,6 +23,14 @@ logger = logging.getLogger(__name__)
 class GapAnalyzer:
     """Analyzes gaps between physical and digital music collections."""
     
+    # Physical tracks matched per process.cdist call (bounds the score matrix size)
+    QUERY_BLOCK_ROWS = 256
+    # Threads used by process.cdist (-1 = all cores)
+    SCORER_WORKERS = -1
+    # Track fields copied into gap analysis records
+    PHYSICAL_COLUMNS = ['artist', 'title', 'album', 'label', 'format_type', 'release_year', 'catalog_number']
+    DIGITAL_COLUMNS = ['artist', 'title', 'album', 'genre', 'bpm']
+    
     def __init__(self, nml_path: str, db_path: str = "./data/musictool.db"):
         """
         Initialize the Gap Analyzer.
@@ -39,6 +46,26 @@ class GapAnalyzer:
         self.digital_collection = self._load_digital_collection()
         self.physical_collection = self._load_physical_collection()
         
+        # Normalized match strings for the digital collection, built once
+        self.digital_choices = self._build_digital_choices()
+        self.digital_blank = {field: is_blank(choices) for field, choices in self.digital_choices.items()}
+        self.digital_columns = {
+            column: self.digital_collection[column].to_numpy()
+            for column in self.DIGITAL_COLUMNS if column in self.digital_collection.columns
+        }
+        
+        # First digital position of every normalized (artist, title) pair, so exact
+        # matches skip fuzzy scoring entirely. Pairs with a blank field are left out:
+        # blank fields score 0, so they are not perfect matches.
+        self.exact_index: Dict[Tuple[str, str], int] = {}
+        for pos, key in enumerate(zip(self.digital_choices['artist'], self.digital_choices['title'])):
+            if not (self.digital_blank['artist'][pos] or self.digital_blank['title'][pos]):
+                self.exact_index.setdefault(key, pos)
+        
+        # Best match per normalized (artist, title) query; the digital side is fixed
+        # for the lifetime of the analyzer, so results stay valid across calls
+        self.match_cache: Dict[Tuple[str, str], Optional[Tuple]] = {}
+        
         logger.info(f"Gap Analyzer initialized:")
         logger.info(f"  Digital tracks: {len(self.digital_collection)}")
         logger.info(f"  Physical tracks: {len(self.physical_collection)}")
@@ -64,11 +91,21 @@ class GapAnalyzer:
             return pd.DataFrame()
         
         gap_results = []
+        phys_artists = [self._normalize_text(artist) for artist in self.physical_collection['artist']]
+        phys_titles = [self._normalize_text(title) for title in self.physical_collection['title']]
+        
+        # Read record fields straight from the column arrays instead of building
+        # a Series per row
+        physical_columns = {
+            column: self.physical_collection[column].to_numpy() for column in self.PHYSICAL_COLUMNS
+        }
+        
+        queries = list(zip(phys_artists, phys_titles))
+        matches = self._match_cached(queries)
         
-        # For each physical track, try to find it in digital collection
-        for idx, physical_track in self.physical_collection.iterrows():
-            result = self._find_track_in_digital(physical_track, confidence_threshold)
-            gap_results.append(result)
+        for pos, query in enumerate(queries):
+            physical_track = {column: values[pos] for column, values in physical_columns.items()}
+            gap_results.append(self._build_result(physical_track, matches[query], confidence_threshold))
         
         # Convert to DataFrame
         gap_df = pd.DataFrame(gap_results)
@@ -92,40 +129,104 @@ class GapAnalyzer:
         phys_artist = self._normalize_text(physical_track['artist'])
         phys_title = self._normalize_text(physical_track['title'])
         
+        query = (phys_artist, phys_title)
+        match = self._match_cached([query])[query]
+        return self._build_result(physical_track, match, confidence_threshold)
+    
+    def _match_cached(self, queries: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Optional[Tuple]]:
+        """
+        Resolve normalized (artist, title) queries, scoring each distinct one only once.
+        
+        Exact matches are looked up in the exact index; the rest are fuzzy matched
+        a block at a time. Results are kept in match_cache.
+        
+        Args:
+            queries: Normalized (artist, title) pairs, possibly repeated
+            
+        Returns:
+            Dictionary mapping each query to its match (see _match_queries)
+        """
+        pending = []
+        for query in dict.fromkeys(queries):
+            if query in self.match_cache:
+                continue
+            exact_pos = self.exact_index.get(query)
+            if exact_pos is not None:
+                # Every field scores 100; keep the same weighted arithmetic as the fuzzy path
+                self.match_cache[query] = (exact_pos, (100.0 * 0.6) + (100.0 * 0.3) + (100.0 * 0.1),
+                                           100.0, 100.0, 100.0)
+            else:
+                pending.append(query)
+        
+        # Match the remaining queries a block at a time, each block in one batch call per field
+        for block_start in range(0, len(pending), self.QUERY_BLOCK_ROWS):
+            block = pending[block_start:block_start + self.QUERY_BLOCK_ROWS]
+            matches = self._match_queries([artist for artist, _ in block], [title for _, title in block])
+            self.match_cache.update(zip(block, matches))
+        
+        return {query: self.match_cache[query] for query in queries}
+    
+    def _match_queries(self, phys_artists: List[str], phys_titles: List[str]) -> List[Optional[Tuple]]:
+        """
+        Find the best digital match for a batch of normalized physical tracks.
+        
+        Args:
+            phys_artists: Normalized physical artists
+            phys_titles: Normalized physical titles (same order)
+            
+        Returns:
+            One entry per query: None when nothing scored above zero, otherwise
+            (digital position, weighted score, artist score, title score, combined score)
+        """
+        if not self.digital_choices['artist']:
+            return [None] * len(phys_artists)
+        
         # Create search strings
-        phys_artist_title = f"{phys_artist} {phys_title}"
+        phys_artist_titles = [f"{artist} {title}" for artist, title in zip(phys_artists, phys_titles)]
+        
+        # Score the queries against the whole digital collection in one call per field
+        # (blank strings, e.g. titles that normalize to nothing, score 0)
+        artist_scores = score_matrix(phys_artists, self.digital_choices['artist'],
+                                     workers=self.SCORER_WORKERS, blank_choices=self.digital_blank['artist'])
+        title_scores = score_matrix(phys_titles, self.digital_choices['title'],
+                                    workers=self.SCORER_WORKERS, blank_choices=self.digital_blank['title'])
+        combined_scores = score_matrix(phys_artist_titles, self.digital_choices['artist_title'],
+                                       workers=self.SCORER_WORKERS,
+                                       blank_choices=self.digital_blank['artist_title'])
+        
+        # Weighted score (title is more important than artist)
+        weighted_scores = (title_scores * 0.6) + (artist_scores * 0.3) + (combined_scores * 0.1)
+        best_positions = np.argmax(weighted_scores, axis=1)
         
+        matches = []
+        for row, best_pos in enumerate(best_positions):
+            best_confidence = float(weighted_scores[row, best_pos])
+            if best_confidence > 0:
+                matches.append((int(best_pos), best_confidence, float(artist_scores[row, best_pos]),
+                                float(title_scores[row, best_pos]), float(combined_scores[row, best_pos])))
+            else:
+                matches.append(None)
+        
+        return matches
+    
+    def _build_result(self, physical_track: Dict, match: Optional[Tuple], confidence_threshold: int) -> Dict:
+        """Build the gap analysis record for a physical track and its best match."""
         best_match = None
         best_confidence = 0
-        best_match_data = None
         
-        # Search through digital collection
-        for idx, digital_track in self.digital_collection.iterrows():
-            dig_artist = self._normalize_text(digital_track['artist'])
-            dig_title = self._normalize_text(digital_track['title'])
-            dig_artist_title = f"{dig_artist} {dig_title}"
-            
-            # Calculate similarity scores
-            artist_score = fuzz.ratio(phys_artist, dig_artist)
-            title_score = fuzz.ratio(phys_title, dig_title)
-            combined_score = fuzz.ratio(phys_artist_title, dig_artist_title)
-            
-            # Weighted score (title is more important than artist)
-            weighted_score = (title_score * 0.6) + (artist_score * 0.3) + (combined_score * 0.1)
-            
-            if weighted_score > best_confidence:
-                best_confidence = weighted_score
-                best_match_data = digital_track
-                best_match = {
-                    'digital_artist': digital_track['artist'],
-                    'digital_title': digital_track['title'],
-                    'digital_album': digital_track['album'],
-                    'digital_genre': digital_track['genre'],
-                    'digital_bpm': digital_track['bpm'],
-                    'artist_score': artist_score,
-                    'title_score': title_score,
-                    'combined_score': combined_score
-                }
+        if match is not None:
+            best_pos, best_confidence, artist_score, title_score, combined_score = match
+            digital_columns = self.digital_columns
+            best_match = {
+                'digital_artist': digital_columns['artist'][best_pos],
+                'digital_title': digital_columns['title'][best_pos],
+                'digital_album': digital_columns['album'][best_pos],
+                'digital_genre': digital_columns['genre'][best_pos],
+                'digital_bpm': digital_columns['bpm'][best_pos],
+                'artist_score': artist_score,
+                'title_score': title_score,
+                'combined_score': combined_score
+            }
         
         # Determine match status
         if best_confidence >= confidence_threshold:
@@ -169,31 +270,32 @@ class GapAnalyzer:
         
         return result
     
+    def _build_digital_choices(self) -> Dict[str, List[str]]:
+        """Collect the pre-normalized digital match strings for batch scoring."""
+        if self.digital_collection.empty:
+            return {'artist': [], 'title': [], 'artist_title': []}
+        
+        return {
+            'artist': self.digital_collection['_norm_artist'].tolist(),
+            'title': self.digital_collection['_norm_title'].tolist(),
+            'artist_title': self.digital_collection['_norm_artist_title'].tolist(),
+        }
+    
     def _normalize_text(self, text: str) -> str:
         """Normalize text for better matching."""
-        if not text or pd.isna(text):
-            return ''
-        
-        # Convert to lowercase
-        text = str(text).lower()
-        
-        # Remove common prefixes/suffixes
-        text = re.sub(r'\b(the|a|an)\b', '', text)
-        text = re.sub(r'\(.*?\)', '', text)  # Remove parentheses content
-        text = re.sub(r'\[.*?\]', '', text)  # Remove bracket content
-        
-        # Remove special characters and extra spaces
-        text = re.sub(r'[^\w\s]', ' ', text)
-        text = re.sub(r'\s+', ' ', text)
-        text = text.strip()
-        
-        return text
+        return normalize_text(text)
     
     def _load_digital_collection(self) -> pd.DataFrame:
         """Load digital collection from NML file."""
         try:
             parser = NMLParser(self.nml_path)
             df = parser.parse()
+            
+            # Normalize the matching fields once instead of per comparison
+            df['_norm_artist'] = df['artist'].map(self._normalize_text)
+            df['_norm_title'] = df['title'].map(self._normalize_text)
+            df['_norm_artist_title'] = df['_norm_artist'] + ' ' + df['_norm_title']
+            
             logger.info(f"Loaded {len(df)} digital tracks from NML")
             return df
         except Exception as e:
@@ -8,17 +8,18 @@ Author: MusicTool MVP
 Created: June 12, 2025
 """
 
+import numpy as np
 import pandas as pd
 from typing import Dict, List, Tuple, Optional
 import logging
-from fuzzywuzzy import fuzz
-from fuzzywuzzy import process
-import re
-from collections import defaultdict
+import functools
+import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 from .nml_parser import NMLParser
 from .collection_expander import CollectionExpander, load_api_key_from_env
+from .text_matching import is_blank, normalize_text, ratio, score_matrix
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +27,18 @@ logger = logging.getLogger(__name__)
 class FastGapAnalyzer:
     """Performance-optimized gap analyzer for music collections."""
     
+    # Threads matching physical batches concurrently (RapidFuzz releases the GIL while scoring)
+    MATCH_WORKERS = os.cpu_count() or 1
+    # Threads used by each process.cdist call (queries are already spread over MATCH_WORKERS)
+    SCORER_WORKERS = 1
+    # Distinct raw strings remembered by _normalize_text (artists repeat across many tracks)
+    NORMALIZE_CACHE_SIZE = 50000
+    # Minimum token Jaccard overlap for a candidate to be fuzzy scored
+    MIN_TOKEN_OVERLAP = 0.2
+    # Track fields copied into gap analysis records
+    PHYSICAL_COLUMNS = ['artist', 'title', 'album', 'label', 'format_type', 'release_year', 'catalog_number']
+    DIGITAL_COLUMNS = ['artist', 'title', 'album', 'genre', 'bpm']
+    
     def __init__(self, nml_path: str, db_path: str = "./data/musictool.db"):
         """
         Initialize the Fast Gap Analyzer.
@@ -41,8 +54,30 @@ class FastGapAnalyzer:
         self.digital_collection = self._load_digital_collection()
         self.physical_collection = self._load_physical_collection()
         
+        # Normalized digital match strings, built once and indexed by position
+        self.digital_choices = self._build_digital_choices()
+        self.digital_blank = {field: is_blank(choices) for field, choices in self.digital_choices.items()}
+        self.digital_columns = {
+            column: self.digital_collection[column].to_numpy()
+            for column in self.DIGITAL_COLUMNS if column in self.digital_collection.columns
+        }
+        
         # Create search indexes for faster lookups
-        self.digital_index = self._create_search_index(self.digital_collection)
+        self.digital_index = self._create_search_index(self.digital_choices)
+        
+        # Distinct tokens per digital track, for the token-overlap prefilter
+        self.digital_token_counts = np.array(
+            [len(set(artist_title.split())) for artist_title in self.digital_choices['artist_title']],
+            dtype=np.intp
+        )
+        
+        # First digital position of every normalized (artist, title) pair, so exact
+        # matches skip fuzzy scoring entirely. Pairs with a blank field are left out:
+        # blank fields score 0, so they are not perfect matches.
+        self.exact_index: Dict[Tuple[str, str], int] = {}
+        for pos, key in enumerate(zip(self.digital_choices['artist'], self.digital_choices['title'])):
+            if not (self.digital_blank['artist'][pos] or self.digital_blank['title'][pos]):
+                self.exact_index.setdefault(key, pos)
         
         logger.info(f"Fast Gap Analyzer initialized:")
         logger.info(f"  Digital tracks: {len(self.digital_collection)}")
@@ -55,7 +90,7 @@ class FastGapAnalyzer:
         
         Args:
             confidence_threshold: Minimum confidence score for matches (0-100)
-            batch_size: Process tracks in batches for progress tracking
+            batch_size: Match distinct tracks in batches for progress tracking
             
         Returns:
             DataFrame with gap analysis results
@@ -71,23 +106,73 @@ class FastGapAnalyzer:
             logger.warning("No digital collection data found")
             return pd.DataFrame()
         
-        gap_results = []
         total_tracks = len(self.physical_collection)
         
-        # Process in batches for progress tracking
-        for i in range(0, total_tracks, batch_size):
-            batch_end = min(i + batch_size, total_tracks)
-            batch = self.physical_collection.iloc[i:batch_end]
+        # Normalize the physical side once up front rather than per track
+        phys_artists = [self._normalize_text(artist) for artist in self.physical_collection['artist']]
+        phys_titles = [self._normalize_text(title) for title in self.physical_collection['title']]
+        
+        # Read record fields straight from the column arrays instead of building
+        # a Series per row
+        physical_columns = {
+            column: self.physical_collection[column].to_numpy() for column in self.PHYSICAL_COLUMNS
+        }
+        
+        # Match each distinct normalized (artist, title) once: the same track often
+        # appears on several physical releases/formats
+        queries = list(zip(phys_artists, phys_titles))
+        unique_queries = list(dict.fromkeys(queries))
+        total_queries = len(unique_queries)
+        
+        def process_batch(i: int) -> List[Tuple[float, Optional[Dict]]]:
+            batch_end = min(i + batch_size, total_queries)
             
-            logger.info(f"Processing batch {i//batch_size + 1}: tracks {i+1}-{batch_end} of {total_tracks}")
+            logger.info(f"Processing batch {i//batch_size + 1}: tracks {i+1}-{batch_end} of {total_queries}")
             
-            # Process each track in the batch
-            for idx, physical_track in batch.iterrows():
-                result = self._find_track_in_digital_fast(physical_track, confidence_threshold)
-                gap_results.append(result)
+            return [self._match_query(artist, title) for artist, title in unique_queries[i:batch_end]]
+        
+        # Process in batches for progress tracking, spread over worker threads;
+        # map() yields the batches back in order
+        batch_starts = range(0, total_queries, batch_size)
+        matches = {}
+        with ThreadPoolExecutor(max_workers=self.MATCH_WORKERS) as pool:
+            for i, batch_matches in zip(batch_starts, pool.map(process_batch, batch_starts)):
+                matches.update(zip(unique_queries[i:i + batch_size], batch_matches))
+        
+        # Fill preallocated result columns by row instead of building a dict per track
+        gap_columns = {
+            # Physical track info
+            'physical_artist': physical_columns['artist'],
+            'physical_title': physical_columns['title'],
+            'physical_album': physical_columns['album'],
+            'physical_label': physical_columns['label'],
+            'physical_format': physical_columns['format_type'],
+            'physical_year': physical_columns['release_year'],
+            'physical_catalog': physical_columns['catalog_number'],
+            
+            # Match results
+            'status': np.empty(total_tracks, dtype=object),
+            'confidence': np.zeros(total_tracks),
+            'status_reason': np.empty(total_tracks, dtype=object),
+            
+            # Best match info (if any)
+            'digital_artist': np.full(total_tracks, '', dtype=object),
+            'digital_title': np.full(total_tracks, '', dtype=object),
+            'digital_album': np.full(total_tracks, '', dtype=object),
+            'digital_genre': np.full(total_tracks, '', dtype=object),
+            'digital_bpm': np.zeros(total_tracks),
+            
+            # Detailed scores
+            'artist_score': np.zeros(total_tracks),
+            'title_score': np.zeros(total_tracks),
+            'combined_score': np.zeros(total_tracks)
+        }
+        for pos, query in enumerate(queries):
+            self._fill_result(gap_columns, pos, matches[query], confidence_threshold)
         
-        # Convert to DataFrame
-        gap_df = pd.DataFrame(gap_results)
+        # Convert to DataFrame, with status as a two-value categorical
+        gap_df = pd.DataFrame(gap_columns)
+        gap_df['status'] = pd.Categorical(gap_df['status'], categories=['found', 'missing'])
         
         # Performance metrics
         elapsed_time = time.time() - start_time
@@ -106,109 +191,141 @@ class FastGapAnalyzer:
         
         return gap_df
     
-    def _create_search_index(self, digital_df: pd.DataFrame) -> Dict[str, List[int]]:
-        """Create a search index for faster lookups."""
-        index = defaultdict(list)
-        
-        for idx, track in digital_df.iterrows():
-            # Normalize and create search keys
-            artist = self._normalize_text(track['artist'])
-            title = self._normalize_text(track['title'])
-            
-            # Index by first few characters for quick filtering
-            if artist:
-                artist_prefix = artist[:3] if len(artist) >= 3 else artist
-                index[f"artist:{artist_prefix}"].append(idx)
-            
-            if title:
-                title_prefix = title[:3] if len(title) >= 3 else title
-                index[f"title:{title_prefix}"].append(idx)
-            
-            # Index by combined key
-            if artist and title:
-                combined_prefix = f"{artist} {title}"[:6]
-                index[f"combined:{combined_prefix}"].append(idx)
-        
-        return dict(index)
-    
-    def _find_track_in_digital_fast(self, physical_track: pd.Series, confidence_threshold: int) -> Dict:
-        """Find a physical track in the digital collection using fast lookup."""
-        
-        # Normalize track info for matching
-        phys_artist = self._normalize_text(physical_track['artist'])
-        phys_title = self._normalize_text(physical_track['title'])
-        
-        # Get candidate tracks from index
-        candidates = set()
-        
-        # Look up by artist prefix
-        if phys_artist:
-            artist_prefix = phys_artist[:3] if len(phys_artist) >= 3 else phys_artist
-            candidates.update(self.digital_index.get(f"artist:{artist_prefix}", []))
+    def _build_digital_choices(self) -> Dict[str, np.ndarray]:
+        """Normalize the digital artist/title columns once for indexing and scoring."""
+        if self.digital_collection.empty:
+            empty = np.array([], dtype=object)
+            return {'artist': empty, 'title': empty, 'artist_title': empty}
         
-        # Look up by title prefix
-        if phys_title:
-            title_prefix = phys_title[:3] if len(phys_title) >= 3 else phys_title
-            candidates.update(self.digital_index.get(f"title:{title_prefix}", []))
+        artists = self.digital_collection['artist'].map(self._normalize_text).to_numpy(dtype=object)
+        titles = self.digital_collection['title'].map(self._normalize_text).to_numpy(dtype=object)
+        artist_titles = np.array([f"{artist} {title}" for artist, title in zip(artists, titles)], dtype=object)
         
-        # Look up by combined prefix
-        if phys_artist and phys_title:
-            combined_prefix = f"{phys_artist} {phys_title}"[:6]
-            candidates.update(self.digital_index.get(f"combined:{combined_prefix}", []))
+        return {'artist': artists, 'title': titles, 'artist_title': artist_titles}
+    
+    def _create_search_index(self, digital_choices: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """
+        Create an inverted token index for faster lookups.
         
-        # If no candidates found, fall back to a small random sample
-        if not candidates:
-            # Take a small sample for fuzzy matching as last resort
-            sample_size = min(100, len(self.digital_collection))
-            candidates = set(self.digital_collection.sample(n=sample_size).index)
+        Args:
+            digital_choices: Normalized digital match strings
+            
+        Returns:
+            Dict mapping each normalized artist/title token to the sorted digital
+            positions whose artist or title contains it
+        """
+        tokens = pd.Series(digital_choices['artist_title'], dtype=object).str.split().explode()
+        
+        # One (position, token) pair per distinct token of every track; tracks
+        # without any tokens explode to a missing token, which groupby drops
+        pairs = pd.DataFrame({'position': tokens.index.to_numpy(), 'token': tokens.to_numpy()})
+        pairs = pairs.drop_duplicates()
+        
+        # int32 postings halve the memory of the default int64 and concatenate faster
+        positions = pairs['position'].to_numpy(dtype=np.int32)
+        return {
+            token: positions[rows]
+            for token, rows in pairs.groupby('token')['position'].indices.items()
+        }
+    
+    def _match_query(self, phys_artist: str, phys_title: str) -> Tuple[float, Optional[Dict]]:
+        """
+        Find a normalized physical track in the digital collection using fast lookup.
         
-        # Limit candidates to reasonable number for performance
-        if len(candidates) > 200:
-            candidates = set(list(candidates)[:200])
+        Args:
+            phys_artist: Normalized physical artist
+            phys_title: Normalized physical title
+            
+        Returns:
+            (best weighted confidence, best match fields and scores or None)
+        """
+        # Get candidate tracks from index: every track sharing at least one token
+        phys_tokens = set(f"{phys_artist} {phys_title}".split())
+        
+        # An exact hit scores 100 on every field, which no other candidate can beat
+        exact_pos = self.exact_index.get((phys_artist, phys_title)) if phys_tokens else None
+        if exact_pos is not None:
+            # Keep the same weighted arithmetic as the fuzzy path
+            return ((100.0 * 0.6) + (100.0 * 0.3) + (100.0 * 0.1),
+                    self._match_fields(exact_pos, 100.0, 100.0, 100.0))
+        
+        postings = [self.digital_index[token] for token in phys_tokens if token in self.digital_index]
+        
+        # A track sharing no tokens with the digital collection has no candidates
+        # and is reported missing without any fuzzy scoring
+        candidates = np.empty(0, dtype=np.int32)
+        if postings:
+            candidates, shared_tokens = np.unique(np.concatenate(postings), return_counts=True)
+            
+            # Drop candidates whose tokens barely overlap the query's before any
+            # fuzzy scoring
+            overlap = shared_tokens / (len(phys_tokens) + self.digital_token_counts[candidates] - shared_tokens)
+            candidates = candidates[overlap >= self.MIN_TOKEN_OVERLAP]
         
         logger.debug(f"Checking {len(candidates)} candidates for: {phys_artist} - {phys_title}")
         
         best_match = None
         best_confidence = 0
-        best_match_data = None
         
         # Create search strings
         phys_artist_title = f"{phys_artist} {phys_title}"
         
-        # Search through candidate tracks only
-        for idx in candidates:
-            digital_track = self.digital_collection.iloc[idx]
+        if len(candidates):
+            # Score titles first: they carry 60% of the weight, so a candidate can
+            # beat another by at most 40 points through its artist/combined scores.
+            # Blank strings (e.g. titles that normalize to nothing) score 0.
+            title_scores = score_matrix([phys_title], self.digital_choices['title'][candidates],
+                                        workers=self.SCORER_WORKERS,
+                                        blank_choices=self.digital_blank['title'][candidates])[0]
             
-            dig_artist = self._normalize_text(digital_track['artist'])
-            dig_title = self._normalize_text(digital_track['title'])
-            dig_artist_title = f"{dig_artist} {dig_title}"
+            # Fully score the best title, then drop every candidate that could not
+            # reach that weighted score even with perfect artist/combined scores
+            lead = int(np.argmax(title_scores))
+            lead_pos = candidates[lead]
+            lead_confidence = ((title_scores[lead] * 0.6)
+                               + (ratio(phys_artist, self.digital_choices['artist'][lead_pos]) * 0.3)
+                               + (ratio(phys_artist_title, self.digital_choices['artist_title'][lead_pos]) * 0.1))
+            contenders = np.flatnonzero((title_scores * 0.6) + 40 >= lead_confidence - 1e-9)
+            candidates = candidates[contenders]
+            title_scores = title_scores[contenders]
             
-            # Calculate similarity scores
-            artist_score = fuzz.ratio(phys_artist, dig_artist)
-            title_score = fuzz.ratio(phys_title, dig_title)
-            combined_score = fuzz.ratio(phys_artist_title, dig_artist_title)
+            # Score the remaining candidates in one call per field instead of a Python loop
+            artist_scores = score_matrix([phys_artist], self.digital_choices['artist'][candidates],
+                                         workers=self.SCORER_WORKERS,
+                                         blank_choices=self.digital_blank['artist'][candidates])[0]
+            combined_scores = score_matrix([phys_artist_title], self.digital_choices['artist_title'][candidates],
+                                           workers=self.SCORER_WORKERS,
+                                           blank_choices=self.digital_blank['artist_title'][candidates])[0]
             
             # Weighted score (title is more important than artist)
-            weighted_score = (title_score * 0.6) + (artist_score * 0.3) + (combined_score * 0.1)
+            weighted_scores = (title_scores * 0.6) + (artist_scores * 0.3) + (combined_scores * 0.1)
+            best = int(np.argmax(weighted_scores))
             
-            if weighted_score > best_confidence:
-                best_confidence = weighted_score
-                best_match_data = digital_track
-                best_match = {
-                    'digital_artist': digital_track['artist'],
-                    'digital_title': digital_track['title'],
-                    'digital_album': digital_track['album'],
-                    'digital_genre': digital_track['genre'],
-                    'digital_bpm': digital_track['bpm'],
-                    'artist_score': artist_score,
-                    'title_score': title_score,
-                    'combined_score': combined_score
-                }
-                
-                # Early termination for near-perfect matches
-                if weighted_score >= 95:
-                    logger.debug(f"Near-perfect match found ({weighted_score:.1f}%), stopping search")
-                    break
+            if weighted_scores[best] > best_confidence:
+                best_confidence = float(weighted_scores[best])
+                best_match = self._match_fields(candidates[best], float(artist_scores[best]),
+                                                float(title_scores[best]), float(combined_scores[best]))
+        
+        return best_confidence, best_match
+    
+    def _match_fields(self, best_pos: int, artist_score: float, title_score: float,
+                      combined_score: float) -> Dict:
+        """Collect the digital track fields and detailed scores of a best match."""
+        return {
+            'digital_artist': self.digital_columns['artist'][best_pos],
+            'digital_title': self.digital_columns['title'][best_pos],
+            'digital_album': self.digital_columns['album'][best_pos],
+            'digital_genre': self.digital_columns['genre'][best_pos],
+            'digital_bpm': self.digital_columns['bpm'][best_pos],
+            'artist_score': artist_score,
+            'title_score': title_score,
+            'combined_score': combined_score
+        }
+    
+    def _fill_result(self, gap_columns: Dict[str, np.ndarray], pos: int,
+                     match: Tuple[float, Optional[Dict]], confidence_threshold: int):
+        """Write the match results for the physical track at row pos into gap_columns."""
+        best_confidence, best_match = match
         
         # Determine match status
         if best_confidence >= confidence_threshold:
@@ -221,56 +338,20 @@ class FastGapAnalyzer:
             else:
                 status_reason = "No good matches found"
         
-        # Build result record
-        result = {
-            # Physical track info
-            'physical_artist': physical_track['artist'],
-            'physical_title': physical_track['title'],
-            'physical_album': physical_track['album'],
-            'physical_label': physical_track['label'],
-            'physical_format': physical_track['format_type'],
-            'physical_year': physical_track['release_year'],
-            'physical_catalog': physical_track['catalog_number'],
-            
-            # Match results
-            'status': status,
-            'confidence': best_confidence,
-            'status_reason': status_reason,
-            
-            # Best match info (if any)
-            'digital_artist': best_match['digital_artist'] if best_match else '',
-            'digital_title': best_match['digital_title'] if best_match else '',
-            'digital_album': best_match['digital_album'] if best_match else '',
-            'digital_genre': best_match['digital_genre'] if best_match else '',
-            'digital_bpm': best_match['digital_bpm'] if best_match else 0,
-            
-            # Detailed scores
-            'artist_score': best_match['artist_score'] if best_match else 0,
-            'title_score': best_match['title_score'] if best_match else 0,
-            'combined_score': best_match['combined_score'] if best_match else 0
-        }
+        gap_columns['status'][pos] = status
+        gap_columns['confidence'][pos] = best_confidence
+        gap_columns['status_reason'][pos] = status_reason
         
-        return result
+        # Best match info and detailed scores keep their defaults without a match
+        if best_match:
+            for field, value in best_match.items():
+                gap_columns[field][pos] = value
     
-    def _normalize_text(self, text: str) -> str:
-        """Normalize text for better matching."""
-        if not text or pd.isna(text):
-            return ''
-        
-        # Convert to lowercase
-        text = str(text).lower()
-        
-        # Remove common prefixes/suffixes
-        text = re.sub(r'\b(the|a|an)\b', '', text)
-        text = re.sub(r'\(.*?\)', '', text)  # Remove parentheses content
-        text = re.sub(r'\[.*?\]', '', text)  # Remove bracket content
-        
-        # Remove special characters and extra spaces
-        text = re.sub(r'[^\w\s]', ' ', text)
-        text = re.sub(r'\s+', ' ', text)
-        text = text.strip()
-        
-        return text
+    @staticmethod
+    @functools.lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+    def _normalize_text(text: str) -> str:
+        """Normalize text for better matching (memoized, shared by all instances)."""
+        return normalize_text(text)
     
     def _load_digital_collection(self) -> pd.DataFrame:
         """Load digital collection from NML file."""
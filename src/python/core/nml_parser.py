@@ -10,26 +10,52 @@ Created: June 12, 2025
 
 import pandas as pd
 from lxml import etree
+import hashlib
+import pickle
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Optional, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Bump whenever parse() output changes so stale cached DataFrames are ignored
+PARSE_CACHE_VERSION = 2
+
+# Readable names for Traktor's numeric key values: 0-11 major, 12-23 minor
+# (a basic mapping - Traktor's key system is more complex)
+_PITCH_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+_TRAKTOR_KEYS = tuple(f"{pitch}maj" for pitch in _PITCH_NAMES) + tuple(f"{pitch}min" for pitch in _PITCH_NAMES)
+
 
 class NMLParser:
     """Parser for Traktor NML collection files."""
     
-    def __init__(self, nml_file_path: str):
+    # Output columns, in the order _extract_track_data returns them
+    COLUMNS = [
+        'artist', 'title', 'album', 'album_track', 'genre', 'label', 'bpm', 'key', 'playtime',
+        'file_path', 'release_date', 'play_count', 'last_played', 'filesize', 'filetype'
+    ]
+    # Explicit dtypes (the rest are strings): small-range numbers are downcast and
+    # low-cardinality strings stored as categoricals. filesize stays int64 since
+    # files can exceed 2 GiB.
+    COLUMN_DTYPES = {
+        'bpm': 'float32', 'playtime': 'int32', 'play_count': 'int32', 'filesize': 'int64',
+        'genre': 'category', 'label': 'category', 'key': 'category', 'filetype': 'category'
+    }
+    
+    def __init__(self, nml_file_path: str, cache_dir: Optional[str] = "./data/.cache"):
         """
         Initialize the NML parser.
         
         Args:
             nml_file_path: Path to the NML file
+            cache_dir: Directory for caching parsed output (None to disable)
         """
         self.nml_file_path = Path(nml_file_path)
         if not self.nml_file_path.exists():
             raise FileNotFoundError(f"NML file not found: {nml_file_path}")
+        
+        self.cache_dir = Path(cache_dir) if cache_dir else None
     
     def parse(self) -> pd.DataFrame:
         """
@@ -53,35 +79,88 @@ class NMLParser:
             - filesize: File size in bytes
             - filetype: File extension (mp3, flac, aiff, etc.)
         """
+        cached = self._read_cache()
+        if cached is not None:
+            return cached
+        
         logger.info(f"Parsing NML file: {self.nml_file_path}")
         
         try:
-            # Parse XML
-            tree = etree.parse(str(self.nml_file_path))
-            root = tree.getroot()
-            
-            # Extract all ENTRY elements
-            entries = root.xpath("//ENTRY")
-            logger.info(f"Found {len(entries)} tracks in NML file")
-            
+            # Stream ENTRY elements instead of loading the whole document, freeing
+            # each one once it has been extracted so memory stays flat
             tracks = []
-            for entry in entries:
+            entry_count = 0
+            for _, entry in etree.iterparse(str(self.nml_file_path), events=('end',), tag='ENTRY'):
+                entry_count += 1
                 track_data = self._extract_track_data(entry)
                 if track_data:
                     tracks.append(track_data)
+                
+                entry.clear()
+                while entry.getprevious() is not None:
+                    del entry.getparent()[0]
             
-            # Convert to DataFrame
-            df = pd.DataFrame(tracks)
-            logger.info(f"Successfully parsed {len(df)} tracks")
+            logger.info(f"Found {entry_count} tracks in NML file")
             
+            # Convert to DataFrame one column list at a time rather than re-packing
+            # a dict per row
+            columns = list(zip(*tracks)) or [()] * len(self.COLUMNS)
+            df = pd.DataFrame({
+                name: pd.Series(values, dtype=self.COLUMN_DTYPES.get(name, str))
+                for name, values in zip(self.COLUMNS, columns)
+            })
+            logger.info(f"Successfully parsed {len(df)} tracks")
+            self._write_cache(df)
             return df
             
         except Exception as e:
             logger.error(f"Error parsing NML file: {e}")
             raise
     
-    def _extract_track_data(self, entry) -> Optional[Dict]:
-        """Extract track data from a single ENTRY element."""
+    def _cache_file(self) -> Path:
+        """Cache location for this NML file (one file per source path)."""
+        path_hash = hashlib.sha1(str(self.nml_file_path.resolve()).encode('utf-8')).hexdigest()[:16]
+        return self.cache_dir / f"nml_{path_hash}.pkl"
+    
+    def _cache_key(self) -> tuple:
+        """Key that changes whenever the NML file is modified or the parser output changes."""
+        stat = self.nml_file_path.stat()
+        return (PARSE_CACHE_VERSION, stat.st_mtime_ns, stat.st_size)
+    
+    def _read_cache(self) -> Optional[pd.DataFrame]:
+        """Return the cached parse result if it matches the current NML file."""
+        if self.cache_dir is None:
+            return None
+        
+        cache_file = self._cache_file()
+        if not cache_file.exists():
+            return None
+        
+        try:
+            with open(cache_file, 'rb') as f:
+                cached = pickle.load(f)
+            if cached['key'] != self._cache_key():
+                return None
+            logger.info(f"Loaded {len(cached['tracks'])} tracks from parse cache: {cache_file}")
+            return cached['tracks']
+        except Exception as e:
+            logger.warning(f"Error reading parse cache {cache_file}: {e}")
+            return None
+    
+    def _write_cache(self, df: pd.DataFrame):
+        """Store the parse result alongside the key it was computed for."""
+        if self.cache_dir is None:
+            return
+        
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with open(self._cache_file(), 'wb') as f:
+                pickle.dump({'key': self._cache_key(), 'tracks': df}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logger.warning(f"Error writing parse cache: {e}")
+    
+    def _extract_track_data(self, entry) -> Optional[Tuple]:
+        """Extract track data from a single ENTRY element, as a tuple in COLUMNS order."""
         try:
             # Basic track info from ENTRY attributes
             artist = entry.get('ARTIST', '').strip()
@@ -91,13 +170,19 @@ class NMLParser:
             if not artist or not title:
                 return None
             
+            # Index the child elements in one pass instead of a find() scan per tag
+            # (first occurrence wins, as with find)
+            children = {}
+            for child in entry:
+                children.setdefault(child.tag, child)
+            
             # Album information
-            album_elem = entry.find('ALBUM')
+            album_elem = children.get('ALBUM')
             album = album_elem.get('TITLE', '') if album_elem is not None else ''
             album_track = album_elem.get('TRACK', '') if album_elem is not None else ''
             
             # File location
-            location_elem = entry.find('LOCATION')
+            location_elem = children.get('LOCATION')
             file_path = ''
             if location_elem is not None:
                 directory = location_elem.get('DIR', '').replace('/:', '/')
@@ -105,7 +190,7 @@ class NMLParser:
                 file_path = f"{directory}{filename}" if directory and filename else ''
             
             # Track info
-            info_elem = entry.find('INFO')
+            info_elem = children.get('INFO')
             genre = ''
             label = ''
             playtime = 0
@@ -124,13 +209,13 @@ class NMLParser:
                 filesize = int(info_elem.get('FILESIZE', '0'))  # Filesize in bytes
             
             # Tempo/BPM
-            tempo_elem = entry.find('TEMPO')
+            tempo_elem = children.get('TEMPO')
             bpm = 0.0
             if tempo_elem is not None:
                 bpm = float(tempo_elem.get('BPM', '0'))
             
             # Musical key
-            key_elem = entry.find('MUSICAL_KEY')
+            key_elem = children.get('MUSICAL_KEY')
             key = ''
             if key_elem is not None:
                 # Convert Traktor key value to readable format
@@ -142,23 +227,23 @@ class NMLParser:
             if file_path:
                 filetype = self._extract_filetype(file_path)
             
-            return {
-                'artist': artist,
-                'title': title,
-                'album': album,
-                'album_track': album_track,
-                'genre': genre,
-                'label': label,
-                'bpm': bpm,
-                'key': key,
-                'playtime': playtime,
-                'file_path': file_path,
-                'release_date': release_date,
-                'play_count': play_count,
-                'last_played': last_played,
-                'filesize': filesize,
-                'filetype': filetype
-            }
+            return (
+                artist,
+                title,
+                album,
+                album_track,
+                genre,
+                label,
+                bpm,
+                key,
+                playtime,
+                file_path,
+                release_date,
+                play_count,
+                last_played,
+                filesize,
+                filetype
+            )
             
         except Exception as e:
             logger.warning(f"Error extracting track data: {e}")
@@ -173,16 +258,12 @@ class NMLParser:
         
         try:
             key_num = int(key_value)
-            # This is a basic mapping - Traktor's key system is more complex
-            keys = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
-            if 0 <= key_num <= 11:
-                return f"{keys[key_num]}maj"
-            elif 12 <= key_num <= 23:
-                return f"{keys[key_num - 12]}min"
-            else:
-                return f"Key{key_value}"
         except ValueError:
             return key_value
+        
+        if 0 <= key_num < len(_TRAKTOR_KEYS):
+            return _TRAKTOR_KEYS[key_num]
+        return f"Key{key_value}"
     
     def _extract_filetype(self, file_path: str) -> str:
         """Extract file extension from file path."""
@@ -190,11 +271,8 @@ class NMLParser:
             return ''
         
         # Get the file extension (everything after the last dot)
-        if '.' in file_path:
-            filetype = file_path.split('.')[-1].lower()
-            return filetype
-        
-        return ''
+        _, dot, filetype = file_path.rpartition('.')
+        return filetype.lower() if dot else ''
 
 
 if __name__ == "__main__":
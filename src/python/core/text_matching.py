@@ -0,0 +1,115 @@
+"""
+Text Matching Helpers
+
+Text normalization and fuzzy scoring shared by the gap analyzers and the
+duplicate finder.
+
+Author: MusicTool MVP
+Created: June 12, 2025
+"""
+
+import numpy as np
+import pandas as pd
+import re
+from typing import Optional, Sequence
+from rapidfuzz import fuzz, process
+
+# Normalization patterns, compiled once rather than looked up per call
+_ARTICLE_RE = re.compile(r'\b(the|a|an)\b')
+_PARENS_RE = re.compile(r'\(.*?\)')
+_BRACKETS_RE = re.compile(r'\[.*?\]')
+_REMIX_RE = re.compile(r'\s*-\s*(remix|edit|mix|version|remaster|remastered)\b.*')
+_NON_WORD_RE = re.compile(r'[^\w\s]')
+
+# Maps every ASCII character _NON_WORD_RE would match to a space, so ASCII text
+# (most tags) is cleaned by one str.translate pass instead of a regex
+_ASCII_NON_WORD_TABLE = str.maketrans({
+    c: ' ' for c in map(chr, range(128)) if not (c.isalnum() or c == '_' or c.isspace())
+})
+
+
+def normalize_text(text: str, strip_remix: bool = False) -> str:
+    """
+    Normalize an artist/title tag into a match string.
+    
+    Lowercases, drops articles and parenthesized/bracketed content, turns
+    punctuation into spaces and collapses whitespace.
+    
+    Args:
+        text: Raw tag value (None/NaN normalize to '')
+        strip_remix: Also drop a trailing " - Remix/Edit/Mix/..." suffix
+    
+    Returns:
+        Normalized match string
+    """
+    if not text or pd.isna(text):
+        return ''
+    
+    # Convert to lowercase
+    text = str(text).lower()
+    
+    # Remove common prefixes/suffixes
+    text = _ARTICLE_RE.sub('', text)
+    text = _PARENS_RE.sub('', text)  # Remove parentheses content
+    text = _BRACKETS_RE.sub('', text)  # Remove bracket content
+    if strip_remix:
+        text = _REMIX_RE.sub('', text)
+    
+    # Remove special characters and extra spaces
+    if text.isascii():
+        text = text.translate(_ASCII_NON_WORD_TABLE)
+    else:
+        text = _NON_WORD_RE.sub(' ', text)
+    
+    return ' '.join(text.split())
+
+
+def is_blank(strings: Sequence[str]) -> np.ndarray:
+    """
+    Flag match strings that are empty or whitespace only.
+    
+    Args:
+        strings: Normalized match strings
+    
+    Returns:
+        Boolean array, True where the string carries no text to compare
+    """
+    return np.fromiter((not text or text.isspace() for text in strings), dtype=bool, count=len(strings))
+
+
+def ratio(s1: str, s2: str) -> float:
+    """fuzz.ratio, except that a blank string scores 0 (RapidFuzz scores two empty strings 100)."""
+    if not s1 or not s2 or s1.isspace() or s2.isspace():
+        return 0.0
+    return fuzz.ratio(s1, s2)
+
+
+def score_matrix(queries: Sequence[str], choices: Sequence[str], scorer=fuzz.ratio,
+                 dtype=np.float64, workers: int = 1, score_cutoff: Optional[float] = None,
+                 blank_choices: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Score every query against every choice, with blank strings scoring 0.
+    
+    Titles that normalize to nothing (e.g. "(Intro)" or punctuation-only tags)
+    would otherwise count as perfect matches of each other.
+    
+    Args:
+        queries: Normalized query strings
+        choices: Normalized choice strings
+        scorer: RapidFuzz scorer
+        dtype: Result dtype passed to process.cdist
+        workers: Threads used by process.cdist (-1 = all cores)
+        score_cutoff: Passed to process.cdist
+        blank_choices: Precomputed is_blank(choices), for choices reused across calls
+    
+    Returns:
+        Array of shape (len(queries), len(choices)) with similarity scores
+    """
+    scores = process.cdist(queries, choices, scorer=scorer, dtype=dtype,
+                           score_cutoff=score_cutoff, workers=workers)
+    
+    if blank_choices is None:
+        blank_choices = is_blank(choices)
+    scores[is_blank(queries)] = 0
+    scores[:, blank_choices] = 0
+    return scores
@@ -9,6 +9,7 @@ Created: June 12, 2025
 """
 
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
@@ -27,6 +28,13 @@ from src.python.core.collection_expander import CollectionExpander
 from src.python.core.gap_analyzer_fast import FastGapAnalyzer
 from src.python.core.duplicate_finder import DuplicateFinder
 
+# Columns the browsers filter by exact value; stored as categoricals so the
+# comparison runs on integer codes instead of strings
+CATEGORY_COLUMNS = ('artist', 'genre', 'filetype', 'label', 'format_type')
+
+# Rows sent to the browser per page of the collection tables
+PAGE_SIZE = 100
+
 # Page configuration
 st.set_page_config(
     page_title="MusicTool - Collection Manager",
@@ -74,12 +82,18 @@ st.markdown("""
 def load_collections():
     """Load digital and physical collections with caching."""
     
+    def to_categories(df):
+        for column in CATEGORY_COLUMNS:
+            if column in df.columns:
+                df[column] = df[column].astype('category')
+        return df
+    
     @st.cache_data
     def load_digital_collection():
         nml_path = "./data/collection.nml"
         if Path(nml_path).exists():
             parser = NMLParser(nml_path)
-            return parser.parse()
+            return to_categories(parser.parse())
         return pd.DataFrame()
     
     @st.cache_data
@@ -87,12 +101,43 @@ def load_collections():
         api_key = load_api_key_from_env()
         if api_key:
             expander = CollectionExpander(api_key)
-            return expander.load_physical_collection()
+            df = to_categories(expander.load_physical_collection())
+            # SQLite stores dates as text; parse once so they can be ranked
+            if 'date_added' in df.columns:
+                df['date_added'] = pd.to_datetime(df['date_added'], format='ISO8601', errors='coerce')
+            return df
         return pd.DataFrame()
     
     return load_digital_collection(), load_physical_collection()
 
 
+@st.cache_data
+def _unique_sorted(df: pd.DataFrame, col: str) -> list:
+    """Sorted distinct values of a column, memoized across reruns."""
+    return sorted(df[col].dropna().unique().tolist())
+
+
+@st.cache_data
+def _numeric_bounds(df: pd.DataFrame, col: str, positive_only: bool = False) -> tuple:
+    """Integer (min, max) of a numeric column, memoized across reruns."""
+    values = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float)
+    values = values[values > 0] if positive_only else values[~np.isnan(values)]
+    if len(values) == 0:
+        return 0, 0
+    return int(values.min()), int(values.max())
+
+
+def _paginate(df: pd.DataFrame, page_size: int = PAGE_SIZE) -> pd.DataFrame:
+    """Show a page selector and return only the selected page of rows."""
+    pages = max(1, -(-len(df) // page_size))
+    if pages == 1:
+        return df
+    
+    page = st.number_input(f"Page (of {pages}):", min_value=1, max_value=pages, value=1)
+    start = (page - 1) * page_size
+    return df.iloc[start:start + page_size]
+
+
 def main():
     """Main Streamlit application."""
     
@@ -195,7 +240,7 @@ def show_dashboard(digital_df, physical_df):
     # Recent activity
     if not physical_df.empty and 'date_added' in physical_df.columns:
         st.subheader("📅 Recent Physical Additions")
-        recent_df = physical_df.sort_values('date_added', ascending=False).head(5)
+        recent_df = physical_df.nlargest(5, 'date_added')
         st.dataframe(
             recent_df[['artist', 'title', 'album', 'date_added', 'format_type']],
             use_container_width=True
@@ -216,38 +261,39 @@ def show_digital_collection(digital_df):
     
     with col1:
         # Artist filter
-        artists = ['All'] + sorted(digital_df['artist'].unique().tolist())
+        artists = ['All'] + _unique_sorted(digital_df, 'artist')
         selected_artist = st.selectbox("Artist:", artists)
     
     with col2:
         # Genre filter
-        genres = ['All'] + sorted(digital_df['genre'].unique().tolist())
+        genres = ['All'] + _unique_sorted(digital_df, 'genre')
         selected_genre = st.selectbox("Genre:", genres)
     
     with col3:
         # BPM range
-        if digital_df['bpm'].max() > 0:
+        bpm_lo, bpm_hi = _numeric_bounds(digital_df, 'bpm')
+        if bpm_hi > 0:
             min_bpm, max_bpm = st.slider(
                 "BPM Range:",
-                min_value=int(digital_df['bpm'].min()),
-                max_value=int(digital_df['bpm'].max()),
-                value=(int(digital_df['bpm'].min()), int(digital_df['bpm'].max()))
+                min_value=bpm_lo,
+                max_value=bpm_hi,
+                value=(bpm_lo, bpm_hi)
             )
         else:
             min_bpm, max_bpm = 0, 200
     
-    # Apply filters
-    filtered_df = digital_df.copy()
+    # Apply filters as one combined mask, so only the matching rows are copied
+    mask = np.ones(len(digital_df), dtype=bool)
     
     if selected_artist != 'All':
-        filtered_df = filtered_df[filtered_df['artist'] == selected_artist]
+        mask &= digital_df['artist'].values == selected_artist
     
     if selected_genre != 'All':
-        filtered_df = filtered_df[filtered_df['genre'] == selected_genre]
+        mask &= digital_df['genre'].values == selected_genre
     
-    filtered_df = filtered_df[
-        (filtered_df['bpm'] >= min_bpm) & (filtered_df['bpm'] <= max_bpm)
-    ]
+    bpm = digital_df['bpm'].values
+    mask &= (bpm >= min_bpm) & (bpm <= max_bpm)
+    filtered_df = digital_df.loc[mask]
     
     # Results
     st.subheader(f"📊 Results ({len(filtered_df)} tracks)")
@@ -268,17 +314,16 @@ def show_digital_collection(digital_df):
         }
         
         st.dataframe(
-            filtered_df[display_columns],
+            _paginate(filtered_df[display_columns]),
             column_config=column_config,
             use_container_width=True,
             height=400
         )
         
-        # Export option
-        csv = filtered_df[display_columns].to_csv(index=False)
+        # Export option (the CSV is only built when the button is clicked)
         st.download_button(
             label="📥 Download as CSV",
-            data=csv,
+            data=lambda: filtered_df[display_columns].to_csv(index=False),
             file_name=f"digital_collection_{len(filtered_df)}_tracks.csv",
             mime="text/csv"
         )
@@ -312,39 +357,39 @@ def show_physical_collection(physical_df):
     
     with col1:
         # Format filter
-        formats = ['All'] + sorted(physical_df['format_type'].unique().tolist())
+        formats = ['All'] + _unique_sorted(physical_df, 'format_type')
         selected_format = st.selectbox("Format:", formats)
     
     with col2:
         # Label filter
-        labels = ['All'] + sorted(physical_df['label'].unique().tolist())
+        labels = ['All'] + _unique_sorted(physical_df, 'label')
         selected_label = st.selectbox("Label:", labels)
     
     with col3:
         # Year range
-        if physical_df['release_year'].max() > 0:
-            years = physical_df[physical_df['release_year'] > 0]['release_year']
+        year_lo, year_hi = _numeric_bounds(physical_df, 'release_year', positive_only=True)
+        if year_hi > 0:
             min_year, max_year = st.slider(
                 "Release Year:",
-                min_value=int(years.min()),
-                max_value=int(years.max()),
-                value=(int(years.min()), int(years.max()))
+                min_value=year_lo,
+                max_value=year_hi,
+                value=(year_lo, year_hi)
             )
         else:
             min_year, max_year = 1990, 2025
     
-    # Apply filters
-    filtered_df = physical_df.copy()
+    # Apply filters as one combined mask, so only the matching rows are copied
+    mask = np.ones(len(physical_df), dtype=bool)
     
     if selected_format != 'All':
-        filtered_df = filtered_df[filtered_df['format_type'] == selected_format]
+        mask &= physical_df['format_type'].values == selected_format
     
     if selected_label != 'All':
-        filtered_df = filtered_df[filtered_df['label'] == selected_label]
+        mask &= physical_df['label'].values == selected_label
     
-    filtered_df = filtered_df[
-        (filtered_df['release_year'] >= min_year) & (filtered_df['release_year'] <= max_year)
-    ]
+    release_years = physical_df['release_year'].values
+    mask &= (release_years >= min_year) & (release_years <= max_year)
+    filtered_df = physical_df.loc[mask]
     
     # Results
     st.subheader(f"📊 Results ({len(filtered_df)} tracks)")
@@ -352,16 +397,15 @@ def show_physical_collection(physical_df):
     display_columns = ['artist', 'title', 'album', 'label', 'format_type', 'release_year', 'catalog_number']
     
     st.dataframe(
-        filtered_df[display_columns],
+        _paginate(filtered_df[display_columns]),
         use_container_width=True,
         height=400
     )
     
-    # Export option
-    csv = filtered_df[display_columns].to_csv(index=False)
+    # Export option (the CSV is only built when the button is clicked)
     st.download_button(
         label="📥 Download as CSV",
-        data=csv,
+        data=lambda: filtered_df[display_columns].to_csv(index=False),
         file_name=f"physical_collection_{len(filtered_df)}_tracks.csv",
         mime="text/csv"
     )
@@ -452,10 +496,16 @@ def show_gap_analysis(digital_df, physical_df):
         config = st.session_state.analysis_config
         
         if not gap_results.empty:
+                # Split by status once and reuse the masks in every tab
+                found_mask = gap_results['status'].values == 'found'
+                missing_mask = ~found_mask
+                found_tracks = gap_results.loc[found_mask]
+                missing_tracks = gap_results.loc[missing_mask]
+                
                 # Summary metrics
                 total = len(gap_results)
-                found = len(gap_results[gap_results['status'] == 'found'])
-                missing = len(gap_results[gap_results['status'] == 'missing'])
+                found = len(found_tracks)
+                missing = len(missing_tracks)
                 
                 col1, col2, col3 = st.columns(3)
                 
@@ -481,58 +531,55 @@ def show_gap_analysis(digital_df, physical_df):
                 with tab1:
                     st.subheader("Complete Gap Analysis Results")
                     
-                    # Color-code rows based on status
-                    def color_status(val):
-                        if val == 'found':
-                            return 'background-color: #d4edda'
-                        else:
-                            return 'background-color: #f8d7da'
-                    
                     display_cols = ['physical_artist', 'physical_title', 'physical_album', 
                                   'status', 'confidence', 'digital_title']
                     
-                    styled_df = gap_results[display_cols].style.applymap(
-                        color_status, subset=['status']
-                    )
+                    # Badge the status column instead of styling every cell
+                    status_badges = pd.Categorical(np.where(found_mask, '✅ found', '❌ missing'))
                     
-                    st.dataframe(styled_df, use_container_width=True, height=400)
+                    st.dataframe(
+                        gap_results[display_cols].assign(status=status_badges),
+                        use_container_width=True,
+                        height=400
+                    )
                 
                 with tab2:
-                    found_tracks = gap_results[gap_results['status'] == 'found']
                     if not found_tracks.empty:
                         st.subheader(f"✅ Found Tracks ({len(found_tracks)})")
                         
-                        for idx, track in found_tracks.iterrows():
-                            with st.expander(f"🎵 {track['physical_artist']} - {track['physical_title']}"):
+                        for track in found_tracks.itertuples(index=False):
+                            with st.expander(f"🎵 {track.physical_artist} - {track.physical_title}"):
                                 col1, col2 = st.columns(2)
                                 
+                                # One markdown block per side (trailing double spaces are line breaks)
                                 with col1:
-                                    st.write("**Physical:**")
-                                    st.write(f"Artist: {track['physical_artist']}")
-                                    st.write(f"Title: {track['physical_title']}")
-                                    st.write(f"Album: {track['physical_album']}")
-                                    st.write(f"Label: {track['physical_label']}")
+                                    st.markdown(
+                                        f"**Physical:**  \n"
+                                        f"Artist: {track.physical_artist}  \n"
+                                        f"Title: {track.physical_title}  \n"
+                                        f"Album: {track.physical_album}  \n"
+                                        f"Label: {track.physical_label}"
+                                    )
                                 
                                 with col2:
-                                    st.write("**Digital Match:**")
-                                    st.write(f"Artist: {track['digital_artist']}")
-                                    st.write(f"Title: {track['digital_title']}")
-                                    st.write(f"Album: {track['digital_album']}")
-                                    st.write(f"Confidence: {track['confidence']:.1f}%")
+                                    st.markdown(
+                                        f"**Digital Match:**  \n"
+                                        f"Artist: {track.digital_artist}  \n"
+                                        f"Title: {track.digital_title}  \n"
+                                        f"Album: {track.digital_album}  \n"
+                                        f"Confidence: {track.confidence:.1f}%"
+                                    )
                     else:
                         st.info("No tracks found in digital collection.")
                 
                 with tab3:
-                    missing_tracks = gap_results[gap_results['status'] == 'missing']
                     if not missing_tracks.empty:
                         st.subheader(f"❌ Missing Tracks ({len(missing_tracks)})")
                         
-                        # Group by album
-                        albums = missing_tracks['physical_album'].unique()
+                        # Group by album in one pass, keeping first-seen album order
+                        album_groups = missing_tracks.groupby('physical_album', sort=False, dropna=False)
                         
-                        for album in albums:
-                            album_tracks = missing_tracks[missing_tracks['physical_album'] == album]
-                            
+                        for album, album_tracks in album_groups:
                             with st.expander(f"📀 {album} ({len(album_tracks)} tracks missing)"):
                                 st.dataframe(
                                     album_tracks[['physical_artist', 'physical_title', 'physical_label', 'confidence']],
@@ -540,11 +587,11 @@ def show_gap_analysis(digital_df, physical_df):
                                 )
                         
                         # Export missing tracks
-                        csv = missing_tracks[['physical_artist', 'physical_title', 'physical_album', 
-                                            'physical_label', 'physical_catalog']].to_csv(index=False)
+                        export_columns = ['physical_artist', 'physical_title', 'physical_album', 
+                                          'physical_label', 'physical_catalog']
                         st.download_button(
                             label="📥 Download Missing Tracks",
-                            data=csv,
+                            data=lambda: missing_tracks[export_columns].to_csv(index=False),
                             file_name=f"missing_tracks_{len(missing_tracks)}.csv",
                             mime="text/csv"
                         )
@@ -705,10 +752,9 @@ def show_duplicate_finder(digital_df):
                 col1, col2 = st.columns(2)
                 
                 with col1:
-                    duplicates_csv = duplicates_df.to_csv(index=False)
                     st.download_button(
                         label="📥 Download All Results",
-                        data=duplicates_csv,
+                        data=lambda: duplicates_df.to_csv(index=False),
                         file_name=f"duplicates_all_{len(duplicates_df)}.csv",
                         mime="text/csv"
                     )
@@ -716,10 +762,9 @@ def show_duplicate_finder(digital_df):
                 with col2:
                     duplicates_only = duplicates_df[duplicates_df['status'] == 'duplicate']
                     if not duplicates_only.empty:
-                        duplicates_only_csv = duplicates_only.to_csv(index=False)
                         st.download_button(
                             label="📥 Download Duplicates Only",
-                            data=duplicates_only_csv,
+                            data=lambda: duplicates_only.to_csv(index=False),
                             file_name=f"duplicates_only_{len(duplicates_only)}.csv",
                             mime="text/csv"
                         )
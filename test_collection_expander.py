@@ -11,7 +11,15 @@ import os
 project_root = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, project_root)
 
-from src.python.core.collection_expander import CollectionExpander, expand_collection_cli, load_api_key_from_env
+import asyncio
+import contextlib
+import sqlite3
+import threading
+import time
+
+from src.python.core.collection_expander import (
+    CollectionExpander, expand_collection_cli, load_api_key_from_env, _TRACK_COLUMNS
+)
 
 
 def test_collection_expander():
@@ -72,5 +80,101 @@ def test_collection_expander():
         return None
 
 
+
+def _track_row(release_id, position, title):
+    """Build an expanded_tracks row ordered as _TRACK_COLUMNS."""
+    row = dict.fromkeys(_TRACK_COLUMNS, '')
+    row.update(artist='Artist', title=title, position=position, release_year=2000,
+               discogs_release_id=release_id)
+    return tuple(row[column] for column in _TRACK_COLUMNS)
+
+
+def _track_count(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute('SELECT COUNT(*) FROM expanded_tracks').fetchone()[0]
+
+
+def test_save_batch_is_idempotent(tmp_path, monkeypatch):
+    """Saving the same release batch twice must not duplicate its tracks."""
+    monkeypatch.chdir(tmp_path)
+    db_path = tmp_path / "musictool.db"
+    expander = CollectionExpander("test-key", str(db_path))
+    
+    # Two unnumbered tracks share an empty position but differ by title
+    rows = [_track_row(1, 'A1', 'One'), _track_row(1, 'A2', 'Two'),
+            _track_row(1, '', 'Intro'), _track_row(1, '', 'Outro')]
+    expander._save_expanded_batch(rows, [1])
+    assert _track_count(db_path) == 4
+    
+    expander._save_expanded_batch(rows, [1])
+    assert _track_count(db_path) == 4
+    expander.close()
+
+
+def test_init_database_removes_existing_duplicates(tmp_path, monkeypatch):
+    """Databases from before the unique track key are de-duplicated once on open."""
+    monkeypatch.chdir(tmp_path)
+    db_path = tmp_path / "musictool.db"
+    CollectionExpander("test-key", str(db_path)).close()
+    
+    # Recreate the pre-index state: no unique key and a release saved twice
+    insert_sql = (f"INSERT INTO expanded_tracks ({', '.join(_TRACK_COLUMNS)}) "
+                  f"VALUES ({', '.join('?' for _ in _TRACK_COLUMNS)})")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('DROP INDEX idx_release_track')
+        rows = [_track_row(1, 'A1', 'One'), _track_row(1, 'A2', 'Two')]
+        conn.executemany(insert_sql, rows + rows)
+    assert _track_count(db_path) == 4
+    
+    CollectionExpander("test-key", str(db_path)).close()
+    assert _track_count(db_path) == 2
+
+
+def test_interrupted_flush_finishes_before_final_save(tmp_path, monkeypatch):
+    """Cancelling expansion mid-flush waits for the batch being written instead of racing it."""
+    monkeypatch.chdir(tmp_path)
+    db_path = tmp_path / "musictool.db"
+    expander = CollectionExpander("test-key", str(db_path))
+    
+    @contextlib.asynccontextmanager
+    async def session():
+        yield None
+    
+    async def tracklist(session, release_id):
+        return [{'type_': 'track'}]
+    
+    monkeypatch.setattr(expander.api_client, 'create_async_session', session)
+    monkeypatch.setattr(expander.api_client, 'get_release_tracklist_async', tracklist)
+    monkeypatch.setattr(expander, '_process_release',
+                        lambda i, total, release_id, tracks, releases_by_id, progress: [_track_row(release_id, 'A1', 'One')])
+    
+    # The first flush is slow and signals when it starts writing
+    flush_started = threading.Event()
+    save_batch = expander._save_expanded_batch
+    
+    def slow_save(rows, release_ids):
+        if rows and not flush_started.is_set():
+            flush_started.set()
+            time.sleep(0.3)
+        save_batch(rows, release_ids)
+    
+    monkeypatch.setattr(expander, '_save_expanded_batch', slow_save)
+    
+    async def run():
+        task = asyncio.create_task(expander._expand_releases([1, 2, 3], None, 1, 2, {}))
+        while not flush_started.is_set():
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+        
+        # The batch was committed before the task finished (not just before
+        # asyncio.run joins the executor threads)
+        assert _track_count(db_path) == 2
+    
+    asyncio.run(run())
+    expander.close()
+
+
 if __name__ == "__main__":
     test_collection_expander()
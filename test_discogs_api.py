@@ -6,11 +6,14 @@ Careful testing with rate limiting - only tests a few releases.
 
 import sys
 import os
+import json
+import time
 
 # Add the project root to Python path
 project_root = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, project_root)
 
+from src.python.core import discogs_client
 from src.python.core.discogs_client import DiscogsAPIClient, load_api_key_from_env
 from src.python.core.discogs_parser import DiscogsCSVParser
 
@@ -86,5 +89,147 @@ def test_discogs_api():
         return None
 
 
+
+def test_token_bucket_allows_burst_then_refills(tmp_path):
+    """A full bucket lets a minute's budget through, then spaces requests by the refill rate."""
+    client = DiscogsAPIClient("test-key", cache_dir=str(tmp_path))
+    
+    waits = [client._reserve_request_slot() for _ in range(client.requests_per_minute)]
+    assert max(waits) < 0.1
+    
+    # The bucket is empty now, so the next caller waits about one refill interval
+    assert abs(client._reserve_request_slot() - client.min_delay) < 0.1
+    
+    # Ten idle seconds earn ten tokens
+    client._bucket_last -= 10
+    client._refill_bucket()
+    assert abs(client._bucket_tokens - 9) < 0.1
+    
+    # Refill never exceeds the bucket's capacity
+    client._bucket_last -= 3600
+    client._refill_bucket()
+    assert client._bucket_tokens == client._bucket_capacity
+
+
+class _StubResponse:
+    """Minimal stand-in for a requests.Response."""
+    
+    def __init__(self, status_code, payload=None, headers=None):
+        self.status_code = status_code
+        self.content = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        self.headers = headers or {}
+
+
+def _stub_session_get(client, *responses):
+    """Replace the client's HTTP GET with canned responses, recording the request headers."""
+    sent_headers = []
+    queue = list(responses)
+    
+    def get(url, headers=None, timeout=None):
+        sent_headers.append(headers or {})
+        return queue.pop(0)
+    
+    client.session.get = get
+    return sent_headers
+
+
+def test_unreadable_cache_with_etag_is_refetched(tmp_path):
+    """A leftover ETag without a loadable body must not turn into a 304 with nothing to serve."""
+    (tmp_path / "release_1.json").write_text('{"title": ', encoding='utf-8')
+    (tmp_path / "release_1.etag").write_text('"old"', encoding='utf-8')
+    client = DiscogsAPIClient("test-key", cache_dir=str(tmp_path))
+    
+    release = {'id': 1, 'title': 'Fresh'}
+    sent_headers = _stub_session_get(client, _StubResponse(200, release, {'ETag': '"new"'}))
+    
+    assert client.get_release(1) == release
+    assert 'If-None-Match' not in sent_headers[0]
+    assert (tmp_path / "release_1.etag").read_text(encoding='utf-8') == '"new"'
+
+
+def test_stale_cache_is_revalidated_with_etag(tmp_path):
+    """An expired but readable cache entry is refreshed with If-None-Match and kept on 304."""
+    release = {'id': 2, 'title': 'Cached'}
+    (tmp_path / "release_2.json").write_text(json.dumps(release), encoding='utf-8')
+    (tmp_path / "release_2.etag").write_text('"v1"', encoding='utf-8')
+    client = DiscogsAPIClient("test-key", cache_dir=str(tmp_path), cache_ttl_seconds=0)
+    
+    sent_headers = _stub_session_get(client, _StubResponse(304))
+    
+    assert client.get_release(2) == release
+    assert sent_headers[0]['If-None-Match'] == '"v1"'
+
+
+def test_revalidation_decodes_cached_body_once(tmp_path, monkeypatch):
+    """Checking the cached body before a conditional request also serves the 304 without a second decode."""
+    release = {'id': 5, 'title': 'Cached'}
+    (tmp_path / "release_5.json").write_text(json.dumps(release), encoding='utf-8')
+    (tmp_path / "release_5.etag").write_text('"v1"', encoding='utf-8')
+    client = DiscogsAPIClient("test-key", cache_dir=str(tmp_path), cache_ttl_seconds=0)
+    
+    decodes = []
+    real_loads = discogs_client._loads
+    monkeypatch.setattr(discogs_client, '_loads', lambda raw: decodes.append(raw) or real_loads(raw))
+    _stub_session_get(client, _StubResponse(304))
+    
+    assert client.get_release(5) == release
+    assert len(decodes) == 1
+
+
+def test_rate_limited_request_is_retried_by_client_only(tmp_path):
+    """429s are retried once per RATE_LIMIT_RETRIES by the client, not again by urllib3."""
+    client = DiscogsAPIClient("test-key", cache_dir=str(tmp_path))
+    adapter = client.session.get_adapter(client.base_url)
+    assert 429 not in adapter.max_retries.status_forcelist
+    
+    release = {'id': 3, 'title': 'Throttled'}
+    sent_headers = _stub_session_get(client, _StubResponse(429, headers={'Retry-After': '0'}),
+                                     _StubResponse(200, release))
+    
+    assert client.get_release(3, use_cache=False) == release
+    assert len(sent_headers) == 2
+
+
+def test_cache_entries_expire_after_ttl(tmp_path):
+    """Cache files older than the TTL are misses; fresh ones and cache_ttl_seconds=None are hits."""
+    release = {'id': 4, 'title': 'Aging'}
+    cache_file = tmp_path / "release_4.json"
+    cache_file.write_text(json.dumps(release), encoding='utf-8')
+    
+    client = DiscogsAPIClient("test-key", cache_dir=str(tmp_path), cache_ttl_seconds=3600)
+    assert client._read_cache(4, client.cache_ttl_seconds) == release
+    
+    # Two hours old: a fresh client (nothing in memory yet) treats it as stale
+    two_hours_ago = time.time() - 7200
+    os.utime(cache_file, (two_hours_ago, two_hours_ago))
+    client = DiscogsAPIClient("test-key", cache_dir=str(tmp_path), cache_ttl_seconds=3600)
+    assert client._read_cache(4, client.cache_ttl_seconds) is None
+    
+    client = DiscogsAPIClient("test-key", cache_dir=str(tmp_path), cache_ttl_seconds=None)
+    assert client._read_cache(4, client.cache_ttl_seconds) == release
+
+
+def test_bucket_state_is_saved_periodically_and_on_close(tmp_path):
+    """Requests don't each rewrite _bucket.json; the state is saved per interval and on close."""
+    client = DiscogsAPIClient("test-key", cache_dir=str(tmp_path))
+    bucket_file = tmp_path / "_bucket.json"
+    
+    for _ in range(5):
+        client._reserve_request_slot()
+    assert not bucket_file.exists()
+    
+    # Once the save interval has passed, the next request saves the state
+    client._bucket_saved_at -= client.BUCKET_SAVE_INTERVAL
+    client._reserve_request_slot()
+    assert abs(json.loads(bucket_file.read_text())['tokens'] - 54) < 0.1
+    
+    client._reserve_request_slot()
+    client.close()
+    assert abs(json.loads(bucket_file.read_text())['tokens'] - 53) < 0.1
+    
+    # The next run picks up the remaining budget
+    restored = DiscogsAPIClient("test-key", cache_dir=str(tmp_path))
+    assert abs(restored._bucket_tokens - 53) < 0.1
+
 if __name__ == "__main__":
     test_discogs_api()
@@ -6,13 +6,22 @@ Quick test to validate the Discogs parser works with real data.
 
 import sys
 import os
+import re
+
+import pandas as pd
+import pytest
 
 # Add the project root to Python path
 project_root = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, project_root)
 
+from src.python.core import discogs_parser
 from src.python.core.discogs_parser import DiscogsCSVParser
 
+# Header of a Discogs collection export
+EXPORT_HEADER = ('Catalog#,Artist,Title,Label,Format,Rating,Released,release_id,CollectionFolder,'
+                 'Date Added,Collection Media Condition,Collection Sleeve Condition,Collection Notes')
+
 
 def test_discogs_parser():
     """Test the Discogs CSV parser with the sample collection file."""
@@ -47,5 +56,125 @@ def test_discogs_parser():
         return None
 
 
+
+@pytest.mark.parametrize('engine', ['pyarrow', 'c'])
+def test_parse_blank_rating_and_released(tmp_path, monkeypatch, engine):
+    """Blank Rating/Released cells are normal in exports and must not break parsing."""
+    if engine == 'pyarrow':
+        pytest.importorskip('pyarrow')
+    monkeypatch.setattr(discogs_parser, '_CSV_ENGINE', engine)
+    
+    csv_file = tmp_path / "collection.csv"
+    csv_file.write_text(
+        EXPORT_HEADER + "\n"
+        'ABC 1,Foo,Bar,Lab,"LP, Album",,1999,123,Uncategorized,2024-06-08 10:29:00,Mint (M),,\n'
+        'DEF 2,Baz,Qux,Lab2,"12""",3,,456,Uncategorized,2024-06-09 11:00:00,,,note\n',
+        encoding='utf-8'
+    )
+    
+    df = DiscogsCSVParser(str(csv_file), cache_dir=None).parse()
+    
+    assert df['release_year'].tolist() == [1999, 0]
+    assert df['format_type'].tolist() == ['LP', '12"']
+    assert df['date_added'].dt.strftime('%Y-%m-%d %H:%M:%S').tolist() == ['2024-06-08 10:29:00',
+                                                                        '2024-06-09 11:00:00']
+
+
+# Row-wise reference versions of the normalization helpers, as they were before
+# _normalize_data switched to whole-column string operations
+def _reference_catalog_number(catalog_num):
+    if not catalog_num or catalog_num == 'nan':
+        return ''
+    catalog_clean = str(catalog_num).strip().strip('"')
+    if ',' in catalog_clean:
+        catalog_clean = catalog_clean.split(',')[0].strip()
+    return catalog_clean
+
+
+def _reference_release_year(released):
+    if not released or str(released) == 'nan':
+        return 0
+    year_str = str(released).strip()
+    if year_str.isdigit() and len(year_str) == 4:
+        return int(year_str)
+    year_match = re.search(r'\b(19|20)\d{2}\b', year_str)
+    return int(year_match.group()) if year_match else 0
+
+
+def _reference_artist_name(artist):
+    if not artist or artist == 'nan':
+        return ''
+    artist_clean = str(artist).strip()
+    if artist_clean.lower() in ['various', 'various artists']:
+        return 'Various'
+    return ' '.join(artist_clean.split())
+
+
+def _reference_format_type(format_str):
+    if not format_str or format_str == 'nan':
+        return ''
+    format_lower = str(format_str).lower()
+    if 'lp' in format_lower:
+        return 'LP'
+    elif '12"' in format_str or '12 inch' in format_lower:
+        return '12"'
+    elif '7"' in format_str or '7 inch' in format_lower:
+        return '7"'
+    elif 'cd' in format_lower:
+        return 'CD'
+    elif 'cassette' in format_lower or 'tape' in format_lower:
+        return 'Cassette'
+    return 'Other'
+
+
+def _reference_format_description(format_str):
+    if not format_str or format_str == 'nan':
+        return ''
+    return str(format_str).strip().strip('"')
+
+
+def test_vectorized_normalization_matches_row_wise(tmp_path):
+    """Whole-column normalization gives the same values as the old per-row helpers."""
+    csv_file = tmp_path / "collection.csv"
+    csv_file.write_text(EXPORT_HEADER + "\n", encoding='utf-8')
+    parser = DiscogsCSVParser(str(csv_file), cache_dir=None)
+    
+    catalog_numbers = ['ABC 123', ' "XYZ 1" ', 'CAT 1, CAT 2', '"A,B"', '', 'nan', 'none']
+    released = ['1999', ' 2003 ', '1999-05-00', 'c. 1987', '99', '2101', '', 'nan', 1994.0, float('nan')]
+    artists = ['Various', ' various artists ', 'Various Artists (2)', '  A   Guy\tCalled  Gerald ',
+               '', 'nan', 'Nanna']
+    formats = ['Vinyl, LP, Album', 'Vinyl, 12", 33 ⅓ RPM', '7 inch single', 'CD, Album', 'Cassette',
+               'Tape, Compilation', 'CDr, LP', 'Vinyl, 12 Inch', 'File, MP3', ' "Box Set" ', '', 'nan']
+    
+    size = max(map(len, (catalog_numbers, released, artists, formats)))
+    pad = lambda values: (values * size)[:size]
+    df = parser._normalize_data(pd.DataFrame({
+        'catalog_number': pad(catalog_numbers),
+        'released': pd.Series(pad(released), dtype=object),
+        'artist': pad(artists),
+        'format': pad(formats),
+    }))
+    
+    assert df['catalog_number_clean'].tolist() == [_reference_catalog_number(v) for v in df['catalog_number']]
+    assert df['release_year'].tolist() == [_reference_release_year(v) for v in df['released']]
+    assert df['artist_clean'].tolist() == [_reference_artist_name(v) for v in df['artist']]
+    assert df['format_description'].tolist() == [_reference_format_description(v) for v in df['format']]
+
+
+def test_format_classification_matches_row_wise(tmp_path):
+    """The single-regex format classifier keeps the old keyword priority."""
+    csv_file = tmp_path / "collection.csv"
+    csv_file.write_text(EXPORT_HEADER + "\n", encoding='utf-8')
+    parser = DiscogsCSVParser(str(csv_file), cache_dir=None)
+    
+    # Every pair of keywords in both orders, so priority (not position) decides
+    keywords = ['LP', '12"', '12 Inch', '7"', '7 inch', 'CD', 'Cassette', 'tape', 'File']
+    formats = [f"{a}, {b}" for a in keywords for b in keywords]
+    formats += ['Vinyl\nLP', 'Flexi-disc', 'CDr', 'Vinyl, 10"', '', 'nan'] + formats[:5]
+    
+    format_types = parser._extract_format_types(pd.Series(formats))
+    
+    assert format_types.tolist() == [_reference_format_type(v) for v in formats]
+
 if __name__ == "__main__":
     test_discogs_parser()
@@ -0,0 +1,195 @@
+"""
+Test script for Duplicate Finder
+
+Test duplicate grouping on small generated collections.
+"""
+
+import sys
+import os
+
+import random
+from collections import deque
+
+import numpy as np
+import pytest
+from rapidfuzz import fuzz
+
+# Add the project root to Python path
+project_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, project_root)
+
+from src.python.core.duplicate_finder import DuplicateFinder
+from src.python.core.text_matching import normalize_text
+
+
+@pytest.mark.parametrize("group_by", ["artist_title", "title_only", "filename", "duration"])
+def test_blank_titles_are_not_duplicates(write_nml, group_by):
+    """Tracks whose titles and filenames normalize to nothing must not group as perfect matches."""
+    nml_path = write_nml([
+        {'artist': 'Foo', 'title': '(Intro)', 'file': '(Intro).mp3', 'playtime': 60},
+        {'artist': 'Bar', 'title': '[Interlude]', 'file': '[Interlude].mp3', 'playtime': 60},
+        {'artist': 'Baz', 'title': 'Real Song', 'file': 'Real Song.mp3', 'playtime': 300},
+    ])
+    
+    duplicates = DuplicateFinder(nml_path).find_duplicates(similarity_threshold=60, group_by=group_by)
+    
+    assert duplicates.empty
+
+
+@pytest.mark.parametrize("group_by", ["artist_title", "title_only"])
+def test_token_set_scoring_ignores_word_order_and_extra_words(write_nml, group_by):
+    """Reordered words, featured artists and extra words still group under token set scoring."""
+    nml_path = write_nml([
+        {'artist': 'Foo feat. Bar', 'title': 'Midnight City Lights'},
+        {'artist': 'Bar & Foo', 'title': 'Lights, City, Midnight'},
+        {'artist': 'Foo', 'title': 'Midnight City Lights (Extended)'},
+        {'artist': 'Foo', 'title': 'Midnight City Lights Extended'},
+        {'artist': 'Baz', 'title': 'Morning Glory'},
+    ])
+    
+    # Plain ratio would miss the reordered and extended titles
+    assert fuzz.ratio(normalize_text('Midnight City Lights'), normalize_text('Lights, City, Midnight')) < 85
+    assert fuzz.ratio(normalize_text('Midnight City Lights'), normalize_text('Midnight City Lights Extended')) < 85
+    
+    duplicates = DuplicateFinder(nml_path).find_duplicates(similarity_threshold=85, group_by=group_by)
+    
+    assert sorted(duplicates['track_index']) == [0, 1, 2, 3]
+    assert duplicates['group_id'].nunique() == 1
+    assert (duplicates['similarity'] >= 85).all()
+
+
+def _random_title(rng, vocabulary, words=3):
+    """Title made of random words from the vocabulary."""
+    return ' '.join(rng.choice(vocabulary) for _ in range(words))
+
+
+def _pairwise_scores(finder, group_by):
+    """Full pairwise score matrix of the collection, scored in one block."""
+    positions = np.arange(len(finder.digital_collection))
+    return finder._score_block(finder.track_arrays, positions, positions, group_by)
+
+
+def _greedy_groups(scores, threshold):
+    """Pre-union-find grouping: each unassigned track claims every later unassigned track at or above the threshold."""
+    processed = set()
+    groups = []
+    for ref in range(len(scores)):
+        if ref in processed:
+            continue
+        similar = [pos for pos in range(ref + 1, len(scores))
+                   if pos not in processed and scores[ref, pos] >= threshold]
+        if similar:
+            groups.append([ref] + similar)
+            processed.update(similar)
+        processed.add(ref)
+    return groups
+
+
+def _connected_groups(scores, threshold):
+    """Connected components (two or more tracks) of all above-threshold pairs, by breadth-first search."""
+    linked = (scores >= threshold) & ~np.eye(len(scores), dtype=bool)
+    seen = set()
+    groups = []
+    for start in range(len(scores)):
+        if start in seen:
+            continue
+        seen.add(start)
+        component = [start]
+        queue = deque([start])
+        while queue:
+            for pos in np.flatnonzero(linked[queue.popleft()]):
+                if pos not in seen:
+                    seen.add(pos)
+                    component.append(pos)
+                    queue.append(pos)
+        if len(component) > 1:
+            groups.append(sorted(component))
+    return groups
+
+
+def _found_groups(duplicates):
+    """Track positions of every duplicate group, original first, in group order."""
+    groups = []
+    for _, group in duplicates.groupby('group_id', sort=True):
+        groups.append([int(group['track_index'].iloc[0])] + sorted(group['track_index'].iloc[1:].tolist()))
+    return groups
+
+
+def test_grouping_matches_greedy_grouping_without_chains(write_nml, monkeypatch):
+    """Without transitive chains, union-find groups are the old greedy groups, across block boundaries."""
+    monkeypatch.setattr(DuplicateFinder, 'SCORE_BLOCK_ROWS', 4)
+    rng = random.Random(7)
+    vocabulary = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(7)) for _ in range(60)]
+    
+    # Clusters of spelling variants of one title (all pairs score well above the
+    # threshold), shuffled so each cluster spans several score blocks
+    tracks = []
+    for cluster in range(8):
+        title = _random_title(rng, vocabulary)
+        for variant in [title, title.title(), f"{title}!", f"{title} (Live)"][:rng.randint(1, 4)]:
+            tracks.append({'artist': f"Artist {cluster}", 'title': variant})
+    tracks.extend({'artist': 'Solo', 'title': _random_title(rng, vocabulary)} for _ in range(12))
+    rng.shuffle(tracks)
+    
+    finder = DuplicateFinder(write_nml(tracks))
+    for group_by in ["artist_title", "title_only"]:
+        scores = _pairwise_scores(finder, group_by)
+        expected = _greedy_groups(scores, 85)
+        
+        assert expected
+        assert expected == _connected_groups(scores, 85)
+        assert _found_groups(finder.find_duplicates(similarity_threshold=85, group_by=group_by)) == expected
+
+
+@pytest.mark.parametrize("group_by, threshold", [("artist_title", 75), ("title_only", 75), ("duration", 50)])
+def test_grouping_matches_connected_components(write_nml, monkeypatch, group_by, threshold):
+    """Groups are the connected components of all above-threshold pairs, whatever the block size."""
+    monkeypatch.setattr(DuplicateFinder, 'SCORE_BLOCK_ROWS', 5)
+    rng = random.Random(11)
+    vocabulary = ['love', 'night', 'dance', 'fire', 'dream', 'light', 'heart', 'city', 'summer', 'rain',
+                  'storm', 'river', 'ocean', 'star', 'moon']
+    tracks = [{'artist': rng.choice(['Foo', 'Bar', 'Baz']), 'title': _random_title(rng, vocabulary, 2)}
+              for _ in range(40)]
+    
+    finder = DuplicateFinder(write_nml(tracks))
+    scores = _pairwise_scores(finder, group_by)
+    expected = _connected_groups(scores, threshold)
+    
+    # Several groups, some joined only through chains the greedy grouping splits
+    assert len(expected) > 1
+    assert expected != sorted(sorted(group) for group in _greedy_groups(scores, threshold))
+    
+    duplicates = finder.find_duplicates(similarity_threshold=threshold, group_by=group_by)
+    assert sorted(sorted(group) for group in _found_groups(duplicates)) == expected
+    
+    # Every duplicate's score is its strongest link within its group
+    for _, group in duplicates.groupby('group_id'):
+        members = group['track_index'].to_numpy()
+        for member, similarity in zip(members[1:], group['similarity'].iloc[1:]):
+            links = scores[member, members[members != member]]
+            assert similarity == pytest.approx(links[links >= threshold].max())
+
+
+def test_transitive_chain_across_score_blocks(write_nml):
+    """A-B and B-C above the threshold group A, B and C together even when they fall in different score blocks."""
+    rng = random.Random(3)
+    vocabulary = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(7)) for _ in range(200)]
+    tracks = [{'artist': 'Filler', 'title': _random_title(rng, vocabulary)} for _ in range(700)]
+    
+    # Scores: A-B 97, B-C 94, but A-C only 91
+    chain = {0: 'Sunrise Boulevard', 300: 'Sunrise Boulevards', 600: 'Sunrize Boulevards'}
+    for pos, title in chain.items():
+        tracks[pos] = {'artist': 'Chain', 'title': title}
+    
+    finder = DuplicateFinder(write_nml(tracks))
+    assert len(tracks) > 2 * finder.SCORE_BLOCK_ROWS
+    
+    duplicates = finder.find_duplicates(similarity_threshold=92, group_by="title_only")
+    
+    assert _found_groups(duplicates) == [[0, 300, 600]]
+    # The greedy grouping left C on its own
+    assert _greedy_groups(_pairwise_scores(finder, "title_only"), 92) == [[0, 300]]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -7,11 +7,19 @@ Test the gap analysis between physical and digital collections.
 import sys
 import os
 
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
 # Add the project root to Python path
 project_root = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, project_root)
 
 from src.python.core.gap_analyzer import GapAnalyzer, analyze_gaps_cli
+from src.python.core.gap_analyzer_fast import FastGapAnalyzer
+from src.python.core.text_matching import normalize_text, ratio, score_matrix
 
 
 def test_gap_analyzer():
@@ -74,5 +82,122 @@ def test_gap_analyzer():
         return None
 
 
+
+def _physical_frame(tracks):
+    """Physical collection rows with the columns the gap analyzers copy."""
+    return pd.DataFrame([
+        {'artist': artist, 'title': title, 'album': 'Album', 'label': 'Label', 'format_type': 'LP',
+         'release_year': 2000, 'catalog_number': f"CAT{i}"}
+        for i, (artist, title) in enumerate(tracks)
+    ])
+
+
+def _stub_physical(analyzer_class, physical_df):
+    """Subclass an analyzer to read the physical collection from a DataFrame instead of the database."""
+    class StubAnalyzer(analyzer_class):
+        def _load_physical_collection(self):
+            return physical_df.copy()
+    return StubAnalyzer
+
+
+def test_blank_strings_score_zero():
+    """RapidFuzz scores two empty strings 100; blank match strings must score 0 instead."""
+    assert ratio('', '') == 0
+    assert ratio(' ', ' ') == 0
+    assert ratio('intro', 'intro') == 100
+    
+    scores = score_matrix(['', 'intro', ' '], ['', 'intro'])
+    assert scores.tolist() == [[0, 0], [0, 100], [0, 0]]
+
+
+@pytest.mark.parametrize("analyzer_class", [GapAnalyzer, FastGapAnalyzer])
+def test_blank_titles_are_not_perfect_matches(write_nml, analyzer_class):
+    """Titles that normalize to nothing must not count as perfect title matches."""
+    nml_path = write_nml([
+        {'artist': 'Foo', 'title': '(Intro)'},
+        {'artist': 'Bar', 'title': 'Real Song'},
+    ])
+    physical = _physical_frame([('Foo', '(Intro)'), ('Baz', '!!!'), ('Bar', 'Real Song')])
+    
+    results = _stub_physical(analyzer_class, physical)(nml_path).find_gaps(confidence_threshold=80)
+    
+    assert results['status'].tolist() == ['missing', 'missing', 'found']
+    assert results['title_score'].tolist()[:2] == [0, 0]
+    # Matching artist (30) and "foo " combined string (10), but no title credit
+    assert results['confidence'].iloc[0] == 40
+
+
+def _random_collections(seed):
+    """Digital tracks plus physical tracks derived from them (typos, reordered or dropped words) and unrelated ones."""
+    rng = random.Random(seed)
+    vocabulary = ['love', 'night', 'dance', 'fire', 'dream', 'light', 'heart', 'city', 'summer', 'rain',
+                  'storm', 'river', 'ocean', 'star', 'moon', 'gold', 'wild', 'free', 'deep', 'blue']
+    artists = ['Foo', 'Bar', 'Baz', 'The Qux', 'DJ Quux', 'Corge & Grault']
+    digital = [{'artist': rng.choice(artists), 'title': ' '.join(rng.sample(vocabulary, rng.randint(1, 4)))}
+               for _ in range(150)]
+    
+    physical = []
+    for track in rng.sample(digital, 60):
+        words = track['title'].split()
+        change = rng.choice(['same', 'typo', 'reorder', 'drop', 'artist'])
+        if change == 'typo':
+            word = rng.randrange(len(words))
+            words[word] = words[word][:-1] + 'x'
+        elif change == 'reorder':
+            rng.shuffle(words)
+        elif change == 'drop' and len(words) > 1:
+            words.pop(rng.randrange(len(words)))
+        artist = rng.choice(artists) if change == 'artist' else track['artist']
+        physical.append((artist, ' '.join(words)))
+    physical.extend((rng.choice(artists), ' '.join(rng.sample(vocabulary, 2))) for _ in range(20))
+    physical.extend(('Nobody', 'Unknown Song') for _ in range(3))
+    return digital, physical
+
+
+def _full_scan_confidences(analyzer, physical_tracks, min_overlap):
+    """Best weighted confidence of every physical track, scoring every digital track that passes the overlap rule."""
+    choices = analyzer.digital_choices
+    digital_tokens = [set(artist_title.split()) for artist_title in choices['artist_title']]
+    
+    confidences = []
+    for artist, title in physical_tracks:
+        artist, title = normalize_text(artist), normalize_text(title)
+        artist_title = f"{artist} {title}"
+        tokens = set(artist_title.split())
+        
+        overlap = np.array([len(tokens & other) / len(tokens | other) if tokens & other else 0.0
+                            for other in digital_tokens])
+        scores = ((score_matrix([title], choices['title'])[0] * 0.6)
+                  + (score_matrix([artist], choices['artist'])[0] * 0.3)
+                  + (score_matrix([artist_title], choices['artist_title'])[0] * 0.1))
+        eligible = (overlap > 0) & (overlap >= min_overlap)
+        confidences.append(float(scores[eligible].max()) if eligible.any() else 0.0)
+    return confidences
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_fast_pruning_matches_full_scan(write_nml, seed):
+    """The token index, title-bound pruning and exact shortcut find the same best confidence as a full scan."""
+    digital, physical = _random_collections(seed)
+    nml_path = write_nml(digital)
+    
+    analyzer = _stub_physical(FastGapAnalyzer, _physical_frame(physical))(nml_path)
+    results = analyzer.find_gaps(confidence_threshold=80)
+    
+    expected = _full_scan_confidences(analyzer, physical, FastGapAnalyzer.MIN_TOKEN_OVERLAP)
+    assert results['confidence'].tolist() == pytest.approx(expected)
+    
+    # The reported best match carries the scores that make up its confidence
+    weighted = (results['title_score'] * 0.6) + (results['artist_score'] * 0.3) + (results['combined_score'] * 0.1)
+    assert weighted.tolist() == pytest.approx(results['confidence'].tolist())
+    
+    # Found tracks agree with the exhaustive analyzer, which scores every digital track
+    exhaustive = _stub_physical(GapAnalyzer, _physical_frame(physical))(nml_path).find_gaps(confidence_threshold=80)
+    found = exhaustive['status'] == 'found'
+    assert found.any()
+    assert results['status'].astype(str).tolist() == exhaustive['status'].tolist()
+    assert results['confidence'][found].tolist() == pytest.approx(exhaustive['confidence'][found].tolist())
+
+
 if __name__ == "__main__":
     test_gap_analyzer()